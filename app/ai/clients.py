@@ -0,0 +1,100 @@
+"""One long-lived HTTP connection pool per model provider.
+
+Every chat model, embedding model and search client is built here on top of
+a shared httpx.Client, so connections (and their TLS sessions) are kept
+alive and reused across calls instead of being set up per request. The
+provider SDKs are only imported when the first client is built.
+"""
+import os
+import threading
+from typing import TYPE_CHECKING, Optional
+
+import httpx
+
+from config import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+)
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+    from openai import OpenAI
+
+# provider -> (API key environment variable, default base URL)
+PROVIDERS = {
+    'openai': ('OPENAI_API_KEY', None),
+    'perplexity': ('PERPLEXITY_API_KEY', 'https://api.perplexity.ai'),
+}
+
+_http_clients = {}
+_api_clients = {}
+_chat_models = {}
+_embeddings = None
+_lock = threading.Lock()
+
+
+def http_client(provider: str) -> httpx.Client:
+    """The shared, keep-alive HTTP client for `provider`."""
+    with _lock:
+        client = _http_clients.get(provider)
+        if client is None:
+            client = _http_clients[provider] = httpx.Client(
+                limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY),
+                timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT))
+        return client
+
+
+def openai_client(provider: str, base_url: Optional[str] = None) -> 'OpenAI':
+    """An OpenAI-compatible API client for `provider` on its shared pool."""
+    from openai import OpenAI
+    api_key_env, default_base_url = PROVIDERS[provider]
+    base_url = base_url or default_base_url
+    key = (provider, base_url)
+    client = _api_clients.get(key)
+    if client is None:
+        client = OpenAI(api_key=os.getenv(api_key_env), base_url=base_url,
+                        http_client=http_client(provider))
+        with _lock:
+            client = _api_clients.setdefault(key, client)
+    return client
+
+
+def get_chat_model(model_name: str = "gpt-4o") -> 'ChatOpenAI':
+    """The shared chat model instance for `model_name`."""
+    from langchain_openai import ChatOpenAI
+    from tools.model_metrics import model_call_counter
+    model = _chat_models.get(model_name)
+    if model is None:
+        model = ChatOpenAI(model=model_name, http_client=http_client('openai'),
+                           callbacks=[model_call_counter], stream_usage=True)
+        with _lock:
+            model = _chat_models.setdefault(model_name, model)
+    return model
+
+
+def get_embeddings() -> 'OpenAIEmbeddings':
+    from langchain_openai import OpenAIEmbeddings
+    global _embeddings
+    if _embeddings is None:
+        embeddings = OpenAIEmbeddings(http_client=http_client('openai'))
+        with _lock:
+            if _embeddings is None:
+                _embeddings = embeddings
+    return _embeddings
+
+
+def close_clients() -> None:
+    """Close every pooled connection, e.g. before the process exits."""
+    global _embeddings
+    with _lock:
+        for client in _http_clients.values():
+            client.close()
+        _http_clients.clear()
+        _api_clients.clear()
+        _chat_models.clear()
+        _embeddings = None
@@ -0,0 +1,115 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import tiktoken
+
+from config import CHAT_CONTEXT_TOKEN_BUDGET
+from app.db import (
+    get_message_page,
+    get_messages_between,
+    get_conversation_summary,
+    save_conversation_summary,
+)
+from tools.logging_utils import logger
+from .raven import summarize_conversation
+
+TOKENIZER_MODEL = "gpt-4o"
+# Approximate per-message framing cost in the chat format (role, separators).
+MESSAGE_OVERHEAD_TOKENS = 4
+# Rough characters per token, used when no tokenizer can be loaded.
+CHARS_PER_TOKEN = 4
+
+# Loaded on first use; False once loading failed, e.g. when tiktoken cannot
+# download its encoding offline.
+_encoding = None
+
+
+def _load_encoding():
+    try:
+        try:
+            return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"No tokenizer available, estimating token counts: {e}")
+        return False
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens the way the chat model will, or estimate them without a tokenizer."""
+    global _encoding
+    if _encoding is None:
+        _encoding = _load_encoding()
+    if _encoding is False:
+        return len(text) // CHARS_PER_TOKEN
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    return count_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS
+
+
+def build_chat_context(channel_id: str, budget: int = CHAT_CONTEXT_TOKEN_BUDGET) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    """Return (summary, messages) for the next model call.
+
+    `messages` are the newest messages of the channel that fit in `budget`
+    tokens, oldest first; the latest message is always included. Pages are
+    read newest-first and reading stops as soon as the budget is spent, so
+    the cost depends on the window size rather than the channel's length.
+    """
+    summary_row = get_conversation_summary(channel_id)
+    summarized_through = summary_row['last_message_id'] if summary_row else 0
+
+    window = []
+    used = 0
+    before_id = None
+    while True:
+        page = get_message_page(channel_id, before_id)
+        for message in reversed(page):
+            if message['id'] <= summarized_through:
+                break
+            tokens = message_tokens(message)
+            if window and used + tokens > budget:
+                break
+            window.append(message)
+            used += tokens
+        else:
+            if page:
+                before_id = page[0]['id']
+                continue
+        break
+
+    window.reverse()
+    logger.debug(f"Chat context for {channel_id}: {len(window)} messages, {used} tokens")
+    return (summary_row['summary'] if summary_row else None), window
+
+
+def fold_older_messages(channel_id: str, window_start_id: int, budget: int = CHAT_CONTEXT_TOKEN_BUDGET) -> None:
+    """Fold messages older than the current window into the stored summary.
+
+    Only messages that left the window since the last fold are read, in
+    chunks of at most `budget` tokens, so each update is incremental. Meant
+    to run after the reply has been sent, off the latency path.
+    """
+    summary_row = get_conversation_summary(channel_id)
+    summary = summary_row['summary'] if summary_row else ''
+    summarized_through = summary_row['last_message_id'] if summary_row else 0
+
+    chunk, used = [], 0
+    while True:
+        page = get_messages_between(channel_id, summarized_through, window_start_id)
+        if not page:
+            break
+        for message in page:
+            tokens = message_tokens(message)
+            if chunk and used + tokens > budget:
+                summary = summarize_conversation(summary, chunk)
+                save_conversation_summary(channel_id, summary, chunk[-1]['id'])
+                chunk, used = [], 0
+            chunk.append(message)
+            used += tokens
+        summarized_through = page[-1]['id']
+
+    if chunk:
+        summary = summarize_conversation(summary, chunk)
+        save_conversation_summary(channel_id, summary, chunk[-1]['id'])
+        logger.info(f"Folded messages up to {chunk[-1]['id']} into the {channel_id} summary")
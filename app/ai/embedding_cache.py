@@ -0,0 +1,127 @@
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.db import select_in
+from config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_ITEMS
+from tools.logging_utils import logger
+from tools.metrics import EMBEDDING_SECONDS, EMBEDDING_TEXTS
+
+
+class CachedEmbeddings(Embeddings):
+    """Content-addressed cache in front of another embedding model.
+
+    Vectors are keyed by a hash of the model name and the text. Lookups go
+    to a bounded in-memory LRU first, then to a SQLite file holding float32
+    blobs; only texts missing from both are sent to the wrapped model, in a
+    single batch per call.
+    """
+
+    def __init__(self, underlying: Embeddings, path: str = EMBEDDING_CACHE_PATH,
+                 memory_items: int = EMBEDDING_CACHE_MEMORY_ITEMS):
+        self.underlying = underlying
+        self.model_name = getattr(underlying, 'model', type(underlying).__name__)
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.execute('PRAGMA synchronous = NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY,
+                vector BLOB NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        self._conn.commit()
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).digest()
+
+    def _remember(self, key: bytes, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys: List[bytes]) -> dict:
+        found = {}
+        with self._lock:
+            disk_keys = []
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is None:
+                    disk_keys.append(key)
+                else:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            self._counts['memory_hits'] += len(found)
+
+            rows = select_in(self._conn,
+                             'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})',
+                             disk_keys)
+            for key, blob in rows:
+                vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                self._remember(key, vector)
+                found[key] = vector
+                self._counts['disk_hits'] += 1
+        return found
+
+    def _store(self, items: List[tuple]) -> None:
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, vector)
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)',
+                    [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            with self._lock:
+                self._counts['misses'] += len(missing)
+            with EMBEDDING_SECONDS.time(operation='documents'):
+                vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = list(zip(missing.keys(), vectors))
+            self._store(computed)
+            found.update(computed)
+            logger.debug(f"Embedding cache: {len(missing)} of {len(texts)} texts embedded")
+
+        EMBEDDING_TEXTS.inc(len(texts) - len(missing), result='hit')
+        EMBEDDING_TEXTS.inc(len(missing), result='miss')
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        found = self._lookup([key])
+        if key in found:
+            EMBEDDING_TEXTS.inc(result='hit')
+            return found[key]
+        with self._lock:
+            self._counts['misses'] += 1
+        EMBEDDING_TEXTS.inc(result='miss')
+        with EMBEDDING_SECONDS.time(operation='query'):
+            vector = self.underlying.embed_query(text)
+        self._store([(key, vector)])
+        return vector
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+            counts['memory_items'] = len(self._memory)
+        lookups = counts['memory_hits'] + counts['disk_hits'] + counts['misses']
+        counts['hit_rate'] = (lookups - counts['misses']) / lookups if lookups else 0.0
+        return counts
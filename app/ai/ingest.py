@@ -0,0 +1,164 @@
+"""Bulk loading of notes into Raven's memory.
+
+Texts are split into chunks, embedded in large batches with bounded
+concurrency and written to the vector store batch by batch. Chunk ids are
+derived from the source and content, and every written batch is recorded
+in the database, so an interrupted run picks up where it stopped.
+
+Usage from the repository root:
+
+    python -m app.ai.ingest notes.md more_notes.txt memories.jsonl
+
+JSONL lines are either a JSON string or an object with a "text" field and
+optional "source" and "metadata" fields.
+"""
+import argparse
+import json
+import os
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional
+
+from langchain_core.documents import Document
+
+from app.db import init_db, get_ingested_ids, mark_ingested
+from config import (
+    INGEST_CHUNK_SIZE,
+    INGEST_CHUNK_OVERLAP,
+    INGEST_BATCH_SIZE,
+    INGEST_CONCURRENCY,
+)
+from tools.logging_utils import logger
+from tools.tracing import ContextThreadPoolExecutor
+from .memory import get_memory_embeddings, add_documents
+
+INGEST_NAMESPACE = uuid.UUID('8f3c2d4e-5b6a-4c1d-9e7f-0a1b2c3d4e5f')
+
+
+def parse_records(records: Iterable, source: str) -> List[Dict]:
+    """Normalize strings or {'text', 'source', 'metadata'} dicts into ingest items."""
+    items = []
+    for number, record in enumerate(records, 1):
+        if isinstance(record, str):
+            record = {'text': record}
+        if not isinstance(record, dict) or not record.get('text'):
+            raise ValueError(f"{source}:{number} has no text")
+        items.append({
+            'text': record['text'],
+            'source': record.get('source', f"{source}:{number}"),
+            'metadata': record.get('metadata', {}),
+        })
+    return items
+
+
+def parse_jsonl(lines: Iterable[str], source: str) -> List[Dict]:
+    return parse_records((json.loads(line) for line in lines if line.strip()), source)
+
+
+def read_sources(paths: Iterable[str]) -> List[Dict]:
+    """Load plain-text files as one item each and JSONL files as one item per line."""
+    items = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as file:
+            if path.endswith('.jsonl'):
+                items.extend(parse_jsonl(file, os.path.basename(path)))
+            else:
+                items.append({'text': file.read(), 'source': os.path.basename(path),
+                              'metadata': {}})
+    return items
+
+
+def split_items(items: Iterable[Dict]) -> List[Document]:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=INGEST_CHUNK_SIZE, chunk_overlap=INGEST_CHUNK_OVERLAP)
+    documents = []
+    for item in items:
+        for index, chunk in enumerate(splitter.split_text(item['text'])):
+            doc_id = str(uuid.uuid5(
+                INGEST_NAMESPACE, f"{item['source']}\0{index}\0{chunk}"))
+            metadata = {**item.get('metadata', {}), 'id': doc_id,
+                        'source': item['source']}
+            documents.append(Document(page_content=chunk, metadata=metadata))
+    return documents
+
+
+def ingest(items: Iterable[Dict], progress: Optional[Callable[[Dict], None]] = None,
+           batch_size: int = INGEST_BATCH_SIZE, concurrency: int = INGEST_CONCURRENCY) -> Dict:
+    """Chunk, embed and store `items` ({'text', 'source', 'metadata'} dicts).
+
+    `progress` is called after every written batch with running totals; it
+    may raise to stop the run, which can be resumed later.
+    """
+    documents = split_items(items)
+    done = get_ingested_ids(doc.metadata['id'] for doc in documents)
+    pending = [doc for doc in documents if doc.metadata['id'] not in done]
+    status = {'chunks': len(documents), 'skipped': len(documents) - len(pending),
+              'written': 0}
+    logger.info(f"Ingesting {len(pending)} of {len(documents)} chunks")
+    if progress:
+        progress(dict(status))
+
+    batches = [pending[i:i + batch_size]
+               for i in range(0, len(pending), batch_size)]
+
+    def embed(batch):
+        # Warms the embedding cache; add_documents below then re-reads the
+        # vectors from it instead of calling the API a second time.
+        get_memory_embeddings().embed_documents([doc.page_content for doc in batch])
+        return batch
+
+    with ContextThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='raven-ingest') as pool:
+        futures = []
+        try:
+            # Keep at most `concurrency` batches in flight ahead of the writer.
+            for batch in batches[:concurrency]:
+                futures.append(pool.submit(embed, batch))
+            next_batch = concurrency
+            while futures:
+                batch = futures.pop(0).result()
+                if next_batch < len(batches):
+                    futures.append(pool.submit(embed, batches[next_batch]))
+                    next_batch += 1
+                ids = [doc.metadata['id'] for doc in batch]
+                add_documents(batch, ids)
+                mark_ingested((doc.metadata['id'], doc.metadata['source'])
+                              for doc in batch)
+                status['written'] += len(batch)
+                if progress:
+                    progress(dict(status))
+        finally:
+            for future in futures:
+                future.cancel()
+
+    logger.info(f"Ingestion finished: {status}")
+    return status
+
+
+def main():
+    from tqdm import tqdm
+
+    parser = argparse.ArgumentParser(
+        description="Load text, markdown or JSONL files into Raven's memory.")
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--batch-size', type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument('--concurrency', type=int, default=INGEST_CONCURRENCY)
+    args = parser.parse_args()
+
+    init_db()
+    bar = None
+
+    def progress(status):
+        nonlocal bar
+        if bar is None:
+            bar = tqdm(total=status['chunks'], initial=status['skipped'], unit='chunk')
+        bar.update(status['skipped'] + status['written'] - bar.n)
+
+    status = ingest(read_sources(args.paths), progress,
+                    batch_size=args.batch_size, concurrency=args.concurrency)
+    if bar is not None:
+        bar.close()
+    print(f"{status['written']} chunks written, {status['skipped']} already present")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,109 @@
+import random
+import threading
 import uuid
-from typing import List, Optional
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Callable, List, Optional
 
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+import numpy as np
 from langchain_core.documents import Document
 from langchain_core.messages import HumanMessage
 
-from tools.file_operations import read_prompt_from_file
+from tools.prompt_registry import PromptTemplate, prompts, render_prompt
 from tools.logging_utils import logger
+from tools.metrics import VECTORSTORE_SECONDS
+from config import (
+    MEMORY_SEARCH_CACHE_SIZE,
+    VECTOR_BACKEND,
+    NUMPY_STORE_DIRECTORY,
+    FAST_CONFIRMATIONS,
+    MEMORY_PREFETCH_SIMILARITY,
+)
+from .clients import get_chat_model, get_embeddings
+from .embedding_cache import CachedEmbeddings
 
 # Constants
 PERSIST_DIRECTORY = 'chroma_db'
 MODEL_NAME = "gpt-4o"
 
-# Initialize OpenAI embeddings
-embeddings = OpenAIEmbeddings()
-
-# Initialize Chroma vector store
-vectorstore = Chroma(persist_directory=PERSIST_DIRECTORY,
-                     embedding_function=embeddings)
-
-model = ChatOpenAI(model=MODEL_NAME)
+# The embedding model and the vector store are created on first use, so that
+# importing this module (and starting the server) stays cheap.
+_embeddings = None
+_vectorstore = None
+_init_lock = threading.RLock()
+
+
+def get_memory_embeddings() -> CachedEmbeddings:
+    """OpenAI embeddings behind the on-disk cache."""
+    global _embeddings
+    if _embeddings is None:
+        with _init_lock:
+            if _embeddings is None:
+                _embeddings = CachedEmbeddings(get_embeddings())
+    return _embeddings
+
+
+def embedding_cache_stats() -> dict:
+    """Embedding cache hit counts; empty until the cache is first used."""
+    return _embeddings.stats() if _embeddings is not None else {}
+
+
+def create_vectorstore():
+    """Open the vector store selected by RAVEN_VECTOR_BACKEND."""
+    if VECTOR_BACKEND == 'numpy':
+        from .numpy_store import NumpyVectorStore
+        return NumpyVectorStore(NUMPY_STORE_DIRECTORY, get_memory_embeddings())
+    if VECTOR_BACKEND != 'chroma':
+        raise ValueError(f"Unknown vector backend: {VECTOR_BACKEND}")
+    from langchain_chroma import Chroma
+    return Chroma(persist_directory=PERSIST_DIRECTORY,
+                  embedding_function=get_memory_embeddings())
+
+
+def get_vectorstore():
+    global _vectorstore
+    if _vectorstore is None:
+        with _init_lock:
+            if _vectorstore is None:
+                _vectorstore = create_vectorstore()
+    return _vectorstore
+
+
+# Search results are cached per store generation. Every write to the vector
+# store bumps the generation, so a cached result is never stale.
+_generation = 0
+_search_cache = OrderedDict()
+_search_lock = threading.Lock()
+
+
+def bump_generation() -> None:
+    """Invalidate cached search results after the vector store changed."""
+    global _generation
+    with _search_lock:
+        _generation += 1
+        _search_cache.clear()
+
+
+def cached_search(search_type: str, query: str, k: int, threshold: Optional[float],
+                  search: Callable[[], List[Document]]) -> List[Document]:
+    with _search_lock:
+        key = (search_type, query, k, threshold, _generation)
+        docs = _search_cache.get(key)
+        if docs is not None:
+            _search_cache.move_to_end(key)
+            return list(docs)
+
+    with VECTORSTORE_SECONDS.time(operation=search_type):
+        docs = search()
+
+    with _search_lock:
+        # A write during the search bumped the generation; the key is then
+        # unreachable, so there is no point keeping the entry.
+        if key[-1] == _generation:
+            _search_cache[key] = docs
+            while len(_search_cache) > MEMORY_SEARCH_CACHE_SIZE:
+                _search_cache.popitem(last=False)
+    return list(docs)
 
 
 def process_searched_documents(inquery: str, documents: List[Document]) -> str:
@@ -33,7 +116,7 @@ def process_searched_documents(inquery: str, documents: List[Document]) -> str:
     full_prompt = create_full_prompt(inquery, content)
 
     try:
-        response = model.invoke([HumanMessage(content=full_prompt)])
+        response = get_chat_model(MODEL_NAME).invoke([HumanMessage(content=full_prompt)])
         logger.debug(f"AI response: {response.content}")
         return response.content
     except Exception as e:
@@ -52,19 +135,23 @@ def format_documents(documents: List[Document]) -> str:
 
 def create_full_prompt(inquery: str, content: str) -> str:
     """Create the full prompt for the AI model."""
-    character_prompt = read_prompt_from_file('character.md')
-    memory_prompt = read_prompt_from_file('memory.md')
-    full_prompt = f"{character_prompt}\n\n{memory_prompt}"
-    return full_prompt.replace('{user_prompt}', inquery).replace('{documents}', content)
+    return render_prompt('character.md', 'memory.md', user_prompt=inquery, documents=content)
+
+
+def add_documents(documents: List[Document], ids: List[str]) -> None:
+    """Write documents to the vector store."""
+    try:
+        with VECTORSTORE_SECONDS.time(operation='add'):
+            get_vectorstore().add_documents(documents=documents, ids=ids)
+    finally:
+        bump_generation()
 
 
 def insert_document(data: str) -> str:
     """Insert a new document into the vector store."""
     doc_id = str(uuid.uuid4())
     try:
-        vectorstore.add_documents(
-            documents=[Document(page_content=data, metadata={"id": doc_id})], ids=[doc_id]
-        )
+        add_documents([Document(page_content=data, metadata={"id": doc_id})], [doc_id])
         logger.info(f"Inserted document with ID: {doc_id}")
         return doc_id
     except Exception as e:
@@ -83,7 +170,7 @@ def delete_data(query: str) -> str:
         full_prompt = create_delete_prompt(query, docs)
 
         # Get AI's response (list of IDs to delete)
-        response = model.invoke([HumanMessage(content=full_prompt)])
+        response = get_chat_model(MODEL_NAME).invoke([HumanMessage(content=full_prompt)])
 
         # Parse the response to get the list of IDs
         ids_to_delete = [id.strip()
@@ -95,8 +182,12 @@ def delete_data(query: str) -> str:
         deleted_count = delete_documents_by_ids(ids_to_delete)
 
         # Create a response about the deletion
+        if 'deletedata' in FAST_CONFIRMATIONS:
+            return fast_confirmation(
+                'confirm_delete.md' if deleted_count else 'confirm_delete_none.md',
+                deleted_count=deleted_count)
         result_prompt = create_delete_result_prompt(query, deleted_count)
-        final_response = model.invoke([HumanMessage(content=result_prompt)])
+        final_response = get_chat_model(MODEL_NAME).invoke([HumanMessage(content=result_prompt)])
         logger.info(f"Final response: {final_response.content}")
 
         return final_response.content
@@ -109,8 +200,11 @@ def save_data(query: str) -> str:
     """Save data and generate a response."""
     try:
         res = insert_document(query)
+        if 'savedata' in FAST_CONFIRMATIONS:
+            return fast_confirmation('confirm_save.md' if res else 'confirm_save_failed.md',
+                                     doc_id=res)
         full_prompt = create_save_prompt(query, res)
-        response = model.invoke([HumanMessage(content=full_prompt)])
+        response = get_chat_model(MODEL_NAME).invoke([HumanMessage(content=full_prompt)])
         logger.debug(f"AI response: {response.content}")
         return response.content
     except Exception as e:
@@ -118,24 +212,70 @@ def save_data(query: str) -> str:
         return "An error occurred while saving data."
 
 
-def search_data(query: str) -> str:
-    """Search data based on a query."""
-    return process_searched_documents(query, search_similarity(query))
+def search_data(query: str, documents: Optional[List[Document]] = None) -> str:
+    """Search data based on a query, unless the documents were already retrieved."""
+    if documents is None:
+        documents = search_similarity(query)
+    return process_searched_documents(query, documents)
 
 
 def search_similarity(query: str, k: int = 3) -> List[Document]:
     """Perform a similarity search."""
-    return vectorstore.similarity_search(query, k)
+    return cached_search('similarity', query, k, None,
+                         lambda: get_vectorstore().similarity_search(query, k))
 
 
 def search_similarity_threshold(query: str, k: int = 3, threshold: float = 0.5) -> List[Document]:
     """Perform a similarity search with a threshold."""
-    return vectorstore.search(query, search_type="similarity_score_threshold", k=k, score_threshold=threshold)
+    return cached_search('similarity_score_threshold', query, k, threshold,
+                         lambda: get_vectorstore().search(query, search_type="similarity_score_threshold", k=k, score_threshold=threshold))
 
 
 def search_max_rel(query: str, k: int = 3) -> List[Document]:
     """Perform a max marginal relevance search."""
-    return vectorstore.max_marginal_relevance_search(query, k)
+    return cached_search('mmr', query, k, None,
+                         lambda: get_vectorstore().max_marginal_relevance_search(query, k))
+
+
+class MemoryPrefetch:
+    """A similarity search started before the model has asked for one.
+
+    The search runs on `executor` while the chat model is still working. Its
+    results answer a later searchdata call whose query embeds close enough
+    to the prefetched one, provided the store has not changed in between.
+    """
+
+    def __init__(self, query: str, executor: Executor):
+        self.query = query
+        self.generation = _generation
+        self.future = executor.submit(self._search)
+
+    def _search(self):
+        return get_memory_embeddings().embed_query(self.query), search_similarity(self.query)
+
+    def documents(self) -> Optional[List[Document]]:
+        """Wait for the prefetched documents; None if the search failed."""
+        try:
+            return self.future.result()[1]
+        except Exception as e:
+            logger.error(f"Memory prefetch failed: {e}")
+            return None
+
+    def match(self, query: str) -> Optional[List[Document]]:
+        """The prefetched documents if they also answer `query`, else None."""
+        documents = self.documents()
+        if documents is None or self.generation != _generation:
+            return None
+        if query.strip().lower() == self.query.strip().lower():
+            return documents
+        # Both embeddings come from the cache; the query one is reused by
+        # the regular search if there is no match.
+        prefetched = np.asarray(self.future.result()[0])
+        requested = np.asarray(get_memory_embeddings().embed_query(query))
+        similarity = float(prefetched @ requested /
+                           (np.linalg.norm(prefetched) * np.linalg.norm(requested)))
+        logger.debug(f"Prefetch similarity for {query!r}: {similarity:.3f}")
+        return documents if similarity >= MEMORY_PREFETCH_SIMILARITY else None
 
 
 def delete_documents_by_query(query: str, threshold: float = 0.1) -> int:
@@ -150,7 +290,11 @@ def delete_documents_by_query(query: str, threshold: float = 0.1) -> int:
             document_ids = [result.metadata["id"] for result in docs]
 
             if document_ids:
-                vectorstore.delete(ids=document_ids)
+                try:
+                    with VECTORSTORE_SECONDS.time(operation='delete'):
+                        get_vectorstore().delete(ids=document_ids)
+                finally:
+                    bump_generation()
                 total_deleted += len(document_ids)
                 logger.info(f"Deleted {len(document_ids)} documents.")
 
@@ -165,30 +309,34 @@ def delete_documents_by_ids(ids: List[str]) -> int:
     """Delete documents by their IDs."""
     try:
         logger.debug(f"Deleting documents by IDs: {ids}")
-        vectorstore.delete(ids=ids)
+        try:
+            with VECTORSTORE_SECONDS.time(operation='delete'):
+                get_vectorstore().delete(ids=ids)
+        finally:
+            bump_generation()
         return len(ids)
     except Exception as e:
         logger.error(f"Error deleting documents by IDs: {e}")
         return 0
 
 
+def fast_confirmation(filename: str, **values) -> str:
+    """Pick one line of a confirmation prompt file at random and fill it in."""
+    lines = [line for line in prompts.get(filename).splitlines() if line.strip()]
+    return PromptTemplate(random.choice(lines)).render(**values)
+
+
 def create_delete_prompt(query: str, documents: List[Document]) -> str:
     """Create the prompt for delete operation."""
-    character_prompt = read_prompt_from_file('character.md')
-    delete_prompt = read_prompt_from_file('deletememory.md')
     formatted_docs = format_documents(documents)
-    return f"{character_prompt}\n\n{delete_prompt}".replace('{query}', query).replace('{documents}', formatted_docs)
+    return render_prompt('character.md', 'deletememory.md', query=query, documents=formatted_docs)
 
 
 def create_delete_result_prompt(query: str, deleted_count: int) -> str:
     """Create the prompt for delete result."""
-    character_prompt = read_prompt_from_file('character.md')
-    delete_result_prompt = read_prompt_from_file('deletememory_result.md')
-    return f"{character_prompt}\n\n{delete_result_prompt}".replace('{query}', query).replace('{deleted_count}', str(deleted_count))
+    return render_prompt('character.md', 'deletememory_result.md', query=query, deleted_count=deleted_count)
 
 
 def create_save_prompt(query: str, result: str) -> str:
     """Create the prompt for save operation."""
-    character_prompt = read_prompt_from_file('character.md')
-    save_prompt = read_prompt_from_file('savememory.md')
-    return f"{character_prompt}\n\n{save_prompt}".replace('{save_data}', query).replace('{save_result}', result)
+    return render_prompt('character.md', 'savememory.md', save_data=query, save_result=result)
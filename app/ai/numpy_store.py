@@ -0,0 +1,254 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from app.db import select_in
+
+VECTORS_FILE = 'vectors.f32'
+SIDECAR_FILE = 'documents.db'
+INITIAL_CAPACITY = 1024
+
+
+class NumpyVectorStore(VectorStore):
+    """In-process vector store: a float32 matrix in a memory-mapped file.
+
+    Row i of the matrix holds the unit-normalized embedding of the document
+    stored at row i of a SQLite sidecar (id, text, metadata). Rows are kept
+    dense -- deleting a document moves the last row into its slot -- so a
+    search is one matrix-vector product over the first `count` rows followed
+    by argpartition for the top k.
+
+    Scores are reported like Chroma's default l2 space (squared euclidean
+    distance, which for unit vectors is 2 - 2 * cosine), so relevance
+    thresholds mean the same thing with either backend.
+    """
+
+    def __init__(self, directory: str, embedding_function: Embeddings):
+        self.directory = directory
+        self._embedding = embedding_function
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(os.path.join(directory, SIDECAR_FILE),
+                                     check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.execute('PRAGMA synchronous = NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS documents (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            )
+        ''')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self._conn.commit()
+
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        self.dim = int(row[0]) if row else None
+        self.count = self._conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+        self._matrix = None
+        if self.dim is not None:
+            self._open_matrix()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    # Storage
+
+    def _vectors_path(self) -> str:
+        return os.path.join(self.directory, VECTORS_FILE)
+
+    def _open_matrix(self, min_rows: int = 0) -> None:
+        path = self._vectors_path()
+        row_bytes = self.dim * 4
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        capacity = size // row_bytes
+        if capacity < max(min_rows, 1):
+            capacity = max(INITIAL_CAPACITY, capacity * 2, min_rows)
+            if self._matrix is not None:
+                self._matrix.flush()
+                self._matrix = None
+            with open(path, 'ab') as file:
+                file.truncate(capacity * row_bytes)
+        self._matrix = np.memmap(path, dtype=np.float32, mode='r+',
+                                 shape=(capacity, self.dim))
+
+    def _ensure_capacity(self, rows: int) -> None:
+        if self._matrix is None or self._matrix.shape[0] < rows:
+            self._open_matrix(rows)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def add_vectors(self, vectors: Iterable[List[float]], texts: List[str],
+                    metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None) -> List[str]:
+        """Store precomputed embeddings; existing ids are overwritten in place."""
+        vectors = self._normalize(np.asarray(vectors, dtype=np.float32))
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+            existing = self._rows_for_ids(ids)
+            rows = []
+            next_row = self.count
+            for doc_id in ids:
+                row = existing.get(doc_id)
+                if row is None:
+                    row = existing[doc_id] = next_row
+                    next_row += 1
+                rows.append(row)
+
+            self._ensure_capacity(next_row)
+            self._matrix[rows] = vectors
+            self._matrix.flush()
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO documents (row, id, text, metadata) VALUES (?, ?, ?, ?)',
+                    [(row, doc_id, text, json.dumps(metadata))
+                     for row, doc_id, text, metadata in zip(rows, ids, texts, metadatas)])
+            self.count = next_row
+        return ids
+
+    def _rows_for_ids(self, ids: List[str]) -> dict:
+        return dict(select_in(self._conn, 'SELECT id, row FROM documents WHERE id IN ({placeholders})',
+                              ids))
+
+    def _documents_for_rows(self, rows: List[int]) -> List[Document]:
+        if not rows:
+            return []
+        found = {row: Document(page_content=text, metadata=json.loads(metadata))
+                 for row, text, metadata in select_in(
+                     self._conn, 'SELECT row, text, metadata FROM documents WHERE row IN ({placeholders})',
+                     rows)}
+        return [found[row] for row in rows]
+
+    # VectorStore interface
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        vectors = self._embedding.embed_documents(texts)
+        return self.add_vectors(vectors, texts, metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._lock:
+            rows = sorted(self._rows_for_ids(list(ids)).values(), reverse=True)
+            count = self.count
+            moves = []
+            with self._conn:
+                # Highest rows first, so the row moved into a hole is never
+                # one that is itself about to be deleted.
+                for row in rows:
+                    last = count - 1
+                    self._conn.execute('DELETE FROM documents WHERE row = ?', (row,))
+                    if row != last:
+                        moves.append((row, last))
+                        self._conn.execute(
+                            'UPDATE documents SET row = ? WHERE row = ?', (row, last))
+                    count -= 1
+            # Only touch the matrix once the sidecar committed, so a failed
+            # commit leaves both as they were.
+            for row, last in moves:
+                self._matrix[row] = self._matrix[last]
+            self.count = count
+            if self._matrix is not None:
+                self._matrix.flush()
+        return True
+
+    def _top_k(self, embedding: List[float], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (rows, cosine similarities) of the k best matches, best first."""
+        if not self.count:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = self._normalize(np.asarray(embedding, dtype=np.float32))
+        scores = self._matrix[:self.count] @ query
+        k = min(k, self.count)
+        if k < self.count:
+            rows = np.argpartition(-scores, k - 1)[:k]
+        else:
+            rows = np.arange(self.count)
+        rows = rows[np.argsort(-scores[rows])]
+        return rows, scores[rows]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        with self._lock:
+            rows, scores = self._top_k(embedding, k)
+            documents = self._documents_for_rows(rows.tolist())
+        return [(doc, float(2.0 - 2.0 * score)) for doc, score in zip(documents, scores)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            self._embedding.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embedding.embed_query(query), k)
+
+    def _select_relevance_score_fn(self):
+        # Same mapping langchain_chroma uses for its default l2 space.
+        return lambda distance: 1.0 - distance / math.sqrt(2)
+
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4,
+                                                fetch_k: int = 20, lambda_mult: float = 0.5,
+                                                **kwargs: Any) -> List[Document]:
+        with self._lock:
+            rows, query_scores = self._top_k(embedding, max(fetch_k, k))
+            if not len(rows):
+                return []
+            candidates = np.asarray(self._matrix[rows])
+            pairwise = candidates @ candidates.T
+
+            selected = [0]
+            redundancy = pairwise[0].copy()
+            available = np.ones(len(rows), dtype=bool)
+            available[0] = False
+            while len(selected) < min(k, len(rows)):
+                mmr = lambda_mult * query_scores - (1 - lambda_mult) * redundancy
+                mmr[~available] = -np.inf
+                best = int(np.argmax(mmr))
+                selected.append(best)
+                available[best] = False
+                redundancy = np.maximum(redundancy, pairwise[best])
+            return self._documents_for_rows(rows[selected].tolist())
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20,
+                                      lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self._embedding.embed_query(query), k, fetch_k, lambda_mult)
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings,
+                   metadatas: Optional[List[dict]] = None, directory: str = 'numpy_store',
+                   **kwargs: Any) -> 'NumpyVectorStore':
+        store = cls(directory, embedding)
+        store.add_texts(texts, metadatas, kwargs.get('ids'))
+        return store
@@ -1,12 +1,9 @@
-import os
-from openai import OpenAI
 from tools.logging_utils import log_ai_interaction, logger
+from .clients import openai_client
 
 @log_ai_interaction
 def perplexity_search(query: str, model_name="llama-3.1-sonar-large-128k-online", api_key=None, base_url="https://api.perplexity.ai"):
-    key = os.getenv("PERPLEXITY_API_KEY")
-
-    client = OpenAI(api_key=key, base_url=base_url)
+    client = openai_client('perplexity', base_url)
 
     messages = [
         {
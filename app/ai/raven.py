@@ -1,18 +1,79 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable
 from datetime import date
+import time
 
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.schema import AIMessage
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 
-from tools.file_operations import read_prompt_from_file, extract_function_calls, clean_string
+from tools.file_operations import read_prompt_from_file, FunctionCallParser, clean_string
+from tools.prompt_registry import render_prompt
 from tools.logging_utils import logger
-from .memory import save_data, search_data, delete_data
+from tools.metrics import tool_invocation
+from tools.tracing import ContextThreadPoolExecutor
+from .memory import save_data, search_data, delete_data, format_documents, MemoryPrefetch
 from .onlinesearch import perplexity_search
+from .clients import get_chat_model
+from .search_cache import SearchCache
 from app.db import db_query, db_command
+from config import CHAT_SUMMARY_MAX_WORDS, TOOL_WORKERS, MEMORY_PREFETCH
 
-model = ChatOpenAI(model="gpt-4o")
+MODEL_NAME = "gpt-4o"
+
+# Runs tool calls off the request thread, e.g. while the model is still
+# streaming the rest of its answer.
+tool_executor = ContextThreadPoolExecutor(
+    max_workers=TOOL_WORKERS, thread_name_prefix='raven-tool')
+
+# Online search answers, shared by every session and kept across restarts.
+search_cache = SearchCache()
+
+
+def warm_up() -> None:
+    """Create the models, vector store and tokenizer ahead of the first request."""
+    from .context import count_tokens
+    from .memory import get_vectorstore
+    start = time.perf_counter()
+    try:
+        get_chat_model(MODEL_NAME)
+        get_vectorstore()
+        count_tokens("")
+    except Exception as e:
+        logger.error(f"Warm-up failed: {e}")
+        return
+    logger.info(f"Warm-up finished in {time.perf_counter() - start:.1f}s")
+
+
+def invoke_model(runnable, model_input, on_token: Optional[Callable[[str], None]] = None) -> str:
+    """Run a model or chain and return the response text.
+
+    With `on_token`, the model's streaming interface is used instead and each
+    piece of text is passed to the callback as soon as it arrives.
+    """
+    if on_token is None:
+        return runnable.invoke(model_input).content
+
+    parts = []
+    for chunk in runnable.stream(model_input):
+        if chunk.content:
+            parts.append(chunk.content)
+            on_token(chunk.content)
+    return "".join(parts)
+
+
+def respond_streamer(on_token: Optional[Callable[[str], None]]):
+    """FunctionCallParser `on_string` callback passing on only respond() text.
+
+    The rest of a response (the model's notes, other calls) is internal and
+    is never shown.
+    """
+    if on_token is None:
+        return None
+
+    def on_string(function_name, text):
+        if function_name == "respond":
+            on_token(text)
+
+    return on_string
 
 
 def get_message_placeholder(messages: List[Dict[str, Any]]) -> List[Any]:
@@ -26,13 +87,14 @@ def get_message_placeholder(messages: List[Dict[str, Any]]) -> List[Any]:
 
 
 def online_search(query: str) -> str:
+    return search_cache.get_or_compute(query, search_online)
+
+
+def search_online(query: str) -> str:
     online_results = perplexity_search(query)
-    character_prompt = read_prompt_from_file('character.md')
-    online_prompt = read_prompt_from_file('onlinesearch.md')
-    full_prompt = f"{character_prompt}\n\n{online_prompt}"
-    full_prompt = full_prompt.replace('{user_prompt}', query)
-    full_prompt = full_prompt.replace('{online_results}', online_results)
-    response = model.invoke([HumanMessage(content=full_prompt)])
+    full_prompt = render_prompt('character.md', 'onlinesearch.md',
+                                user_prompt=query, online_results=online_results)
+    response = get_chat_model(MODEL_NAME).invoke([HumanMessage(content=full_prompt)])
     return response.content
 
 
@@ -48,7 +110,12 @@ def respond(query: str) -> str:
     return clean_string(query)
 
 
-def execute_command(command: str, inquiry=()) -> str:
+# Functions with no side effects. Consecutive calls to these may run at the
+# same time; any other function runs alone, in the order the model gave.
+READ_ONLY_FUNCTIONS = {"query", "searchdata", "onlinesearch"}
+
+
+def execute_command(command: str, inquiry=(), prefetch: Optional[MemoryPrefetch] = None) -> str:
     function_map = {
         "searchdata": search_data,
         "savedata": save_data,
@@ -63,7 +130,16 @@ def execute_command(command: str, inquiry=()) -> str:
 
         if command in function_map:
             logger.debug(f"Executing function: {command}")
-            return function_map[command](inquiry)
+            function = function_map[command]
+            if command == "searchdata" and prefetch is not None:
+                documents = prefetch.match(inquiry)
+                if documents is not None:
+                    logger.info(f"Answering searchdata({inquiry}) from prefetched memories")
+                    function = lambda query: search_data(query, documents)
+            with tool_invocation(command) as model_calls:
+                result = function(inquiry)
+            logger.info(f"Function {command} made {model_calls[0]} model call(s)")
+            return result
         else:
             logger.warning(f"Function {command} not recognized.")
             return f"Error: Function {command} not recognized."
@@ -72,17 +148,65 @@ def execute_command(command: str, inquiry=()) -> str:
         return f"exception: {e}"
 
 
-def general_chat_raven(messages: List[Dict[str, Any]]) -> str:
-    logger.info(f"AI Interaction - Input: {messages}")
+def not_cancelled() -> None:
+    """Default cancellation check for pipelines not run as a job."""
+
+
+def run_function_calls(function_calls, check_cancelled: Callable[[], None] = not_cancelled):
+    """Run (name, arguments) calls, yielding (name, arguments, result) in order.
+
+    Each run of consecutive read-only calls is started together on the tool
+    executor; a mutating call waits for everything before it to finish.
+    `check_cancelled` is called before each call is dispatched and raises to
+    stop the remaining ones.
+    """
+    pending = []
+    for function_name, arguments in function_calls:
+        check_cancelled()
+        if function_name in READ_ONLY_FUNCTIONS:
+            pending.append((function_name, arguments, tool_executor.submit(
+                execute_command, function_name, arguments)))
+            continue
+        for name, args, future in pending:
+            yield name, args, future.result()
+        pending = []
+        check_cancelled()
+        yield function_name, arguments, execute_command(function_name, arguments)
+    for name, args, future in pending:
+        yield name, args, future.result()
+
+
+def summarize_conversation(summary: str, messages: List[Dict[str, Any]]) -> str:
+    transcript = "\n\n".join(
+        f"{message['role']}: {message['content']}" for message in messages)
+    summary_prompt = render_prompt('summary.md', summary=summary or "(empty)",
+                                   max_words=CHAT_SUMMARY_MAX_WORDS, messages=transcript)
+    response = get_chat_model(MODEL_NAME).invoke([HumanMessage(content=summary_prompt)])
+    return response.content
+
 
-    character_prompt = read_prompt_from_file('character.md')
-    functions_prompt = read_prompt_from_file('functions.md')
-    functions_prompt = functions_prompt.replace(
-        '{DATE}', date.today().strftime('%Y-%m-%d'))
+def general_chat_raven(messages: List[Dict[str, Any]], summary: Optional[str] = None,
+                       on_token: Optional[Callable[[str], None]] = None,
+                       check_cancelled: Callable[[], None] = not_cancelled) -> str:
+    logger.info(f"AI Interaction - Input: {messages}")
 
     formatted_messages = get_message_placeholder(messages)
 
-    full_prompt = f"{character_prompt}\n\n{functions_prompt}"
+    # Start searching memory for the latest user message before the model
+    # decides whether it needs to.
+    prefetch = None
+    if MEMORY_PREFETCH in ('parallel', 'inject') and messages and messages[-1]['role'] == 'human':
+        prefetch = MemoryPrefetch(messages[-1]['content'], tool_executor)
+
+    full_prompt = render_prompt('character.md', 'functions.md',
+                                DATE=date.today().strftime('%Y-%m-%d'))
+    if summary:
+        full_prompt += f"\n\n### Earlier In This Conversation\n\n{summary}"
+    if prefetch is not None and MEMORY_PREFETCH == 'inject':
+        documents = prefetch.documents()
+        if documents:
+            full_prompt += ("\n\n### Memories That May Be Relevant\n\n"
+                            f"{format_documents(documents)}")
 
     prompt = ChatPromptTemplate.from_messages(
         [
@@ -91,66 +215,83 @@ def general_chat_raven(messages: List[Dict[str, Any]]) -> str:
         ]
     )
 
-    chain = prompt | model
-
-    response = chain.invoke({"messages": formatted_messages})
-    ai_response = response.content
-    logger.info(f"Initial AI response: {ai_response}")
+    chain = prompt | get_chat_model(MODEL_NAME)
 
-    function_calls = extract_function_calls(ai_response)
-    # only do the first function call
-    if len(function_calls) == 0:
-        logger.info(f"AI Interaction - Output: {ai_response}")
-        return ai_response
+    # Only the first function call is used. It is dispatched as soon as the
+    # parser sees it complete, while the model may still be writing.
+    parser = FunctionCallParser(on_string=respond_streamer(on_token))
+    dispatched = []
 
-    function_name, arguments = function_calls[0]
-    if function_name is None:
-        logger.info(f"AI Interaction - Output: {ai_response}")
-        return ai_response
+    def handle_token(text):
+        check_cancelled()
+        if dispatched:
+            return
+        for function_name, arguments in parser.feed(text):
+            logger.info(f"Extracted function: {function_name}({arguments})")
+            dispatched.append((function_name, arguments, tool_executor.submit(
+                execute_command, function_name, arguments, prefetch)))
+            break
 
-    logger.info(f"Extracted function: {function_name}({arguments})")
+    ai_response = invoke_model(
+        chain, {"messages": formatted_messages}, handle_token)
+    logger.info(f"Initial AI response: {ai_response}")
 
-    if function_name:
-        result = execute_command(function_name, arguments)
-        logger.info(f"Function {function_name} result: {result}")
-        ai_response = result
+    if dispatched:
+        function_name, arguments, future = dispatched[0]
+        result = future.result()
+    else:
+        function_calls = parser.close()
+        if len(function_calls) == 0:
+            logger.info(f"AI Interaction - Output: {ai_response}")
+            return ai_response
+        function_name, arguments = function_calls[0]
+        logger.info(f"Extracted function: {function_name}({arguments})")
+        check_cancelled()
+        result = execute_command(function_name, arguments, prefetch)
+
+    logger.info(f"Function {function_name} result: {result}")
+    ai_response = result
 
     logger.info(f"AI Interaction - Output: {ai_response}")
     return ai_response
 
 
-def task_talk(user_msg, tasks_info) -> str:
+def task_talk(user_msg, tasks_info, on_token: Optional[Callable[[str], None]] = None,
+              check_cancelled: Callable[[], None] = not_cancelled) -> str:
     logger.info(f"AI Interaction - Input: {user_msg}")
-    character_prompt = read_prompt_from_file('character.md')
-    tasks_prompt = read_prompt_from_file('tasks.md')
     example_tasks_prompt = read_prompt_from_file('example_tasks.md')
-    tasks_prompt = tasks_prompt.replace(
-        '{date}', date.today().strftime('%Y-%m-%d'))
-    tasks_prompt = tasks_prompt.replace('{user_prompt}', user_msg)
-    tasks_prompt = tasks_prompt.replace('{tasks_info}', tasks_info)
+    today = date.today().strftime('%Y-%m-%d')
     previous_actions = ""
     count = 0
     while count < 4:  # Limiting the number of allowed actions to prevent infinite loops
+        check_cancelled()
         prv_prompt = ""
         if previous_actions != "":
             prv_prompt = f"###Functions already called\n\n{previous_actions}"
         else:
             prv_prompt = example_tasks_prompt
-        full_prompt = f"{character_prompt}\n\n{
-            tasks_prompt.replace('{previous_actions}', prv_prompt)}"
+        full_prompt = render_prompt('character.md', 'tasks.md', date=today, user_prompt=user_msg,
+                                    tasks_info=tasks_info, previous_actions=prv_prompt)
         logger.info(f"Full prompt: {full_prompt}")
-        response = model.invoke([HumanMessage(content=full_prompt)])
-        ai_response = response.content
+        parser = FunctionCallParser(on_string=respond_streamer(on_token))
+        function_calls = []
+
+        def handle_token(text):
+            check_cancelled()
+            function_calls.extend(parser.feed(text))
+
+        ai_response = invoke_model(
+            get_chat_model(MODEL_NAME), [HumanMessage(content=full_prompt)], handle_token)
         logger.info(f"AI task response: {ai_response}")
 
-        function_calls = extract_function_calls(ai_response)
-        for function_name, arguments in function_calls:
-            if function_name is None:
-                continue
+        function_calls.extend(parser.close())
+        calls = [(function_name, arguments) for function_name, arguments
+                 in function_calls if function_name is not None]
+        for function_name, arguments in calls:
             logger.info(f"Extracted function: {function_name}({arguments})")
+        for function_name, arguments, result in run_function_calls(calls, check_cancelled):
             previous_actions += f"Function call:\n\n{
                 function_name}({arguments})\n\n"
-            result = execute_command(function_name, arguments)
             logger.info(f"Function {function_name} result: {result}")
             if function_name == "respond":
                 return result
@@ -0,0 +1,114 @@
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+from config import ONLINE_SEARCH_CACHE_PATH, ONLINE_SEARCH_CACHE_TTL, ONLINE_SEARCH_CACHE_SIZE
+from tools.logging_utils import logger
+
+
+def normalize_query(query: str) -> str:
+    """Fold case, Unicode forms, whitespace and trailing punctuation."""
+    query = unicodedata.normalize('NFKC', query).casefold()
+    query = re.sub(r"\s+", " ", query).strip()
+    return query.rstrip(" ?!.")
+
+
+class SearchCache:
+    """Persisted TTL cache for online search answers, with single-flight.
+
+    Entries are keyed by the normalized query, expire `ttl` seconds after
+    they were stored and are evicted least recently used first beyond
+    `max_entries`. Concurrent lookups of the same missing key wait for the
+    one request already in flight instead of starting their own.
+    """
+
+    def __init__(self, path: str = ONLINE_SEARCH_CACHE_PATH, ttl: float = ONLINE_SEARCH_CACHE_TTL,
+                 max_entries: int = ONLINE_SEARCH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._counts = {'hits': 0, 'misses': 0, 'coalesced': 0}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.execute('PRAGMA synchronous = NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS search_cache (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                used_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_search_cache_used_at ON search_cache (used_at)')
+        self._conn.commit()
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                'SELECT result FROM search_cache WHERE key = ? AND created_at > ?',
+                (key, now - self.ttl)).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    'UPDATE search_cache SET used_at = ? WHERE key = ?', (now, key))
+        return row[0] if row else None
+
+    def _put(self, key: str, result: str) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO search_cache (key, result, created_at, used_at) VALUES (?, ?, ?, ?)',
+                (key, result, now, now))
+            self._conn.execute(
+                'DELETE FROM search_cache WHERE created_at <= ?', (now - self.ttl,))
+            self._conn.execute('''
+                DELETE FROM search_cache WHERE key IN (
+                    SELECT key FROM search_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,))
+
+    def get_or_compute(self, query: str, compute: Callable[[str], str]) -> str:
+        """Return the cached answer for `query`, or compute and store it."""
+        key = normalize_query(query)
+        result = self._get(key)
+        if result is not None:
+            with self._lock:
+                self._counts['hits'] += 1
+            return result
+
+        with self._lock:
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = Future()
+                self._counts['misses'] += 1
+            else:
+                self._counts['coalesced'] += 1
+        if not leader:
+            logger.debug(f"Waiting for in-flight online search: {key}")
+            return flight.result()
+
+        try:
+            result = compute(query)
+            self._put(key, result)
+            flight.set_result(result)
+            return result
+        except Exception as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+            counts['entries'] = self._conn.execute(
+                'SELECT COUNT(*) FROM search_cache').fetchone()[0]
+        return counts
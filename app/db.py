@@ -1,16 +1,121 @@
 # db.py
 import sqlite3
+import threading
+import weakref
 from datetime import datetime
 
+from tools.metrics import DB_SECONDS
+from .migrations import migrate
+
 DATABASE = 'chat_history.db'
+# Messages per page for the chat history view.
+MESSAGE_PAGE_SIZE = 50
+
+# Applied once to every new connection. WAL lets readers run while a write
+# commits, and synchronous=NORMAL only fsyncs at checkpoints, which is still
+# crash-safe in WAL mode. foreign_keys makes the declared ON DELETE CASCADE
+# on tasks.parentID take effect.
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA foreign_keys = ON',
+    'PRAGMA cache_size = -16000',    # ~16MB page cache
+    'PRAGMA mmap_size = 268435456',  # 256MB
+    'PRAGMA temp_store = MEMORY',
+)
+# sqlite3 keeps prepared statements per connection keyed by SQL text, so a
+# long-lived connection only compiles each query in this module once.
+STATEMENT_CACHE_SIZE = 256
+# Connections left behind by finished threads are kept for the next thread.
+MAX_IDLE_CONNECTIONS = 8
+# Values bound per IN (...) query, well under SQLite's variable limit.
+IN_BATCH_SIZE = 500
+
+_local = threading.local()
+_idle_connections = []
+_idle_lock = threading.Lock()
+
+
+class _ConnectionLease:
+    """Holds a thread's connection and hands it back when the thread exits."""
+
+    def __init__(self, conn, path):
+        self.conn = conn
+        self.path = path
+        self.finalizer = weakref.finalize(
+            self, _release_connection, conn, path)
+
+
+def _open_connection(path):
+    # Leases move between threads (sequentially, never concurrently) when a
+    # worker exits, so the same-thread check has to be disabled.
+    conn = sqlite3.connect(path, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    conn.row_factory = sqlite3.Row  # To access columns by name
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _release_connection(conn, path):
+    if conn.in_transaction:
+        conn.rollback()
+    with _idle_lock:
+        if path == DATABASE and len(_idle_connections) < MAX_IDLE_CONNECTIONS:
+            _idle_connections.append((path, conn))
+            return
+    conn.close()
 
 
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row  # To access columns by name
+    """Return the calling thread's connection, opening it on first use.
+
+    The connection stays open for the lifetime of the thread and must not be
+    closed by callers.
+    """
+    lease = getattr(_local, 'lease', None)
+    if lease is not None and lease.path == DATABASE:
+        return lease.conn
+
+    conn = None
+    with _idle_lock:
+        while _idle_connections and conn is None:
+            path, idle = _idle_connections.pop()
+            if path == DATABASE:
+                conn = idle
+            else:
+                idle.close()
+    if conn is None:
+        conn = _open_connection(DATABASE)
+    _local.lease = _ConnectionLease(conn, DATABASE)
     return conn
 
 
+def select_in(conn, sql, values):
+    """Run `sql` for `values` in batches and yield its rows.
+
+    `sql` marks where the IN list goes with {placeholders}.
+    """
+    values = list(values)
+    for start in range(0, len(values), IN_BATCH_SIZE):
+        batch = values[start:start + IN_BATCH_SIZE]
+        yield from conn.execute(sql.format(placeholders=','.join('?' * len(batch))), batch)
+
+
+def close_db_connections():
+    """Close the calling thread's connection and every idle one."""
+    lease = getattr(_local, 'lease', None)
+    _local.lease = None
+    with _idle_lock:
+        idle = list(_idle_connections)
+        _idle_connections.clear()
+    for _, conn in idle:
+        conn.close()
+    if lease is not None:
+        lease.finalizer.detach()
+        lease.conn.close()
+
+
 def init_db():
     conn = get_db_connection()
     c = conn.cursor()
@@ -34,141 +139,483 @@ def init_db():
         )
     ''')
     conn.commit()
-    conn.close()
+    migrate(conn)
+
+
+# Every query function below is timed into raven_db_seconds.
+timed = DB_SECONDS.timed('function')
 
 # Chat Functions
 
 
+@timed
 def store_message(channel_id, role, content):
-    conn = sqlite3.connect('chat_history.db')
-    c = conn.cursor()
-    c.execute('''
-        INSERT INTO messages (channel_id, role, content)
-        VALUES (?, ?, ?)
-    ''', (channel_id, role, content))
-    conn.commit()
-    conn.close()
+    conn = get_db_connection()
+    with conn:
+        c = conn.execute('''
+            INSERT INTO messages (channel_id, role, content)
+            VALUES (?, ?, ?)
+        ''', (channel_id, role, content))
+    return c.lastrowid
 
 
+@timed
 def get_message_history(channel_id):
-    conn = sqlite3.connect('chat_history.db')
-    c = conn.cursor()
-    c.execute('''
+    conn = get_db_connection()
+    c = conn.execute('''
         SELECT role, content FROM messages
         WHERE channel_id = ?
         ORDER BY id ASC
     ''', (channel_id,))
-    messages = [{'role': row[0], 'content': row[1]} for row in c.fetchall()]
-    conn.close()
-    return messages
+    return [{'role': row[0], 'content': row[1]} for row in c.fetchall()]
 
 
-def clear_message_history(channel_id=None):
-    conn = sqlite3.connect('chat_history.db')
-    c = conn.cursor()
+@timed
+def get_message_page(channel_id, before_id=None, limit=MESSAGE_PAGE_SIZE):
+    """Return up to `limit` messages older than `before_id`, oldest first.
 
-    if channel_id:
-        c.execute('DELETE FROM messages WHERE channel_id = ?', (channel_id,))
+    Without `before_id` this is the newest page of the channel. Pages are
+    keyed on the message id, so each one is a single range scan over the
+    (channel_id, id) index no matter how long the history is.
+    """
+    conn = get_db_connection()
+    if before_id is None:
+        c = conn.execute('''
+            SELECT id, role, content FROM messages
+            WHERE channel_id = ?
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (channel_id, limit))
     else:
-        c.execute('DELETE FROM messages')
+        c = conn.execute('''
+            SELECT id, role, content FROM messages
+            WHERE channel_id = ? AND id < ?
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (channel_id, before_id, limit))
+    rows = c.fetchall()
+    return [{'id': row[0], 'role': row[1], 'content': row[2]} for row in reversed(rows)]
 
-    conn.commit()
-    conn.close()
 
-# Tasks Functions
+@timed
+def get_messages_between(channel_id, after_id, before_id, limit=MESSAGE_PAGE_SIZE):
+    """Return up to `limit` messages with after_id < id < before_id, oldest first."""
+    conn = get_db_connection()
+    c = conn.execute('''
+        SELECT id, role, content FROM messages
+        WHERE channel_id = ? AND id > ? AND id < ?
+        ORDER BY id ASC
+        LIMIT ?
+    ''', (channel_id, after_id, before_id, limit))
+    return [{'id': row[0], 'role': row[1], 'content': row[2]} for row in c.fetchall()]
+
+
+@timed
+def clear_message_history(channel_id=None):
+    conn = get_db_connection()
+    with conn:
+        if channel_id:
+            conn.execute(
+                'DELETE FROM messages WHERE channel_id = ?', (channel_id,))
+            conn.execute(
+                'DELETE FROM conversation_summaries WHERE channel_id = ?', (channel_id,))
+        else:
+            conn.execute('DELETE FROM messages')
+            conn.execute('DELETE FROM conversation_summaries')
+
+
+@timed
+def get_conversation_summary(channel_id):
+    conn = get_db_connection()
+    row = conn.execute('''
+        SELECT summary, last_message_id FROM conversation_summaries
+        WHERE channel_id = ?
+    ''', (channel_id,)).fetchone()
+    if row:
+        return dict(row)
+    return None
+
 
+@timed
+def save_conversation_summary(channel_id, summary, last_message_id):
+    conn = get_db_connection()
+    with conn:
+        conn.execute('''
+            INSERT INTO conversation_summaries (channel_id, summary, last_message_id)
+            VALUES (?, ?, ?)
+            ON CONFLICT(channel_id) DO UPDATE SET
+                summary = excluded.summary,
+                last_message_id = excluded.last_message_id
+        ''', (channel_id, summary, last_message_id))
 
+# Memory Ingestion Functions
+
+
+@timed
+def get_ingested_ids(ids):
+    """Return the subset of chunk ids that were already written to the vector store."""
+    conn = get_db_connection()
+    return {row[0] for row in select_in(
+        conn, 'SELECT id FROM ingested_chunks WHERE id IN ({placeholders})', ids)}
+
+
+@timed
+def mark_ingested(chunks):
+    """Record (id, source) pairs as written to the vector store."""
+    now = datetime.now().isoformat()
+    conn = get_db_connection()
+    with conn:
+        conn.executemany('''
+            INSERT OR REPLACE INTO ingested_chunks (id, source, ingested_at)
+            VALUES (?, ?, ?)
+        ''', [(chunk_id, source, now) for chunk_id, source in chunks])
+
+# Tasks Functions
+
+# Tasks are ordered among their siblings by `position`. New tasks go POSITION_GAP
+# after the last sibling, and a move takes the midpoint of its new neighbours,
+# so reordering writes a single row. When neighbours get closer than
+# MIN_POSITION_GAP the list is renumbered first.
+POSITION_GAP = 1024.0
+MIN_POSITION_GAP = 1e-4
+
+# Deleted task ids kept for delta sync (see tasks_since)
+TOMBSTONE_LIMIT = 1000
+
+# Operations accepted by one apply_task_batch call
+MAX_TASK_BATCH = 500
+
+# Columns a task update may set, with the types a batch operation may give them
+TASK_FIELDS = {
+    'title': (str,),
+    'description': (str, type(None)),
+    'completed': (bool, int),
+    'dueDate': (str, type(None)),
+    'parentID': (int, type(None)),
+}
+
+
+# Lets a single-row write return the row it wrote. RETURNING runs before the
+# AFTER triggers stamp the row's version, and each such write bumps the
+# counter exactly once, so the version it will get is the counter plus one.
+TASK_RETURNING = '''
+    RETURNING id, title, description, completed, dueDate, parentID, position,
+              (SELECT version FROM task_sync) + 1 AS version
+'''
+
+
+def _insert_task(conn, title, description='', completed=False, dueDate=None, parentID=None):
+    row = conn.execute('''
+        INSERT INTO tasks (title, description, completed, dueDate, parentID, position)
+        VALUES (?, ?, ?, ?, ?, (
+            SELECT COALESCE(MAX(position), 0) + ? FROM tasks WHERE parentID IS ?
+        ))
+    ''' + TASK_RETURNING,
+        (title, description, int(completed), dueDate, parentID, POSITION_GAP, parentID)).fetchone()
+    return dict(row)
+
+
+@timed
 def create_task(title, description='', completed=False, dueDate=None, parentID=None):
+    """Create a task at the end of its list and return it."""
     conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('''
-        INSERT INTO tasks (title, description, completed, dueDate, parentID)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (title, description, int(completed), dueDate, parentID))
-    conn.commit()
-    task_id = c.lastrowid
-    conn.close()
-    return task_id
+    with conn:
+        return _insert_task(conn, title, description, completed, dueDate, parentID)
 
 
+@timed
 def get_task(task_id):
     conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('SELECT * FROM tasks WHERE id = ?', (task_id,))
-    row = c.fetchone()
-    conn.close()
+    row = conn.execute('SELECT * FROM tasks WHERE id = ?',
+                       (task_id,)).fetchone()
     if row:
         return dict(row)
     return None
 
 
+@timed
+def get_tasks(ids):
+    """Tasks by id, as a dict keyed by id; unknown ids are left out."""
+    conn = get_db_connection()
+    return {row['id']: dict(row)
+            for row in select_in(conn, 'SELECT * FROM tasks WHERE id IN ({placeholders})', ids)}
+
+
+@timed
 def get_all_tasks():
     # get all tasks that are not subtasks
     conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('SELECT * FROM tasks WHERE parentID IS NULL ORDER BY id ASC')
-    rows = c.fetchall()
-    conn.close()
+    rows = conn.execute(
+        'SELECT * FROM tasks WHERE parentID IS NULL ORDER BY position, id').fetchall()
     return [dict(row) for row in rows]
 
 
+@timed
 def update_task(task_id, title=None, description=None, completed=None, dueDate=None, parentID=None):
-    conn = get_db_connection()
-    c = conn.cursor()
-    task = get_task(task_id)
-    if not task:
-        conn.close()
-        return False  # Task not found
+    """Update a task and return it, or None if it does not exist.
 
-    # Update fields if provided
-    new_title = title if title is not None else task['title']
-    new_description = description if description is not None else task['description']
-    new_completed = int(
-        completed) if completed is not None else task['completed']
+    Fields left as None keep their value, except dueDate, which is cleared.
+    """
+    conn = get_db_connection()
+    with conn:
+        row = conn.execute('''
+            UPDATE tasks
+            SET title = COALESCE(?, title), description = COALESCE(?, description),
+                completed = COALESCE(?, completed), dueDate = ?,
+                parentID = COALESCE(?, parentID)
+            WHERE id = ?
+        ''' + TASK_RETURNING, (title, description, None if completed is None else int(completed),
+                               dueDate, parentID, task_id)).fetchone()
+    return dict(row) if row else None
+
+
+@timed
+def delete_task(task_id):
+    return len(delete_task_tree(task_id)) > 0  # Returns True if a row was deleted
+
+
+# Subtree of one task (or every top-level task when the root is NULL), with
+# each row's depth below the root. `path` orders rows depth-first, siblings
+# by position then id, the same order the flat task queries use. Positions
+# are never negative and neighbours differ by at least MIN_POSITION_GAP / 2,
+# so six decimals keep them apart.
+TASK_TREE_SQL = '''
+    WITH RECURSIVE tree(id, depth, path) AS (
+        SELECT id, 0, printf('%020.6f:%010d', position, id) FROM tasks
+        WHERE (:root IS NULL AND parentID IS NULL) OR id = :root
+        UNION ALL
+        SELECT tasks.id, tree.depth + 1,
+               tree.path || '/' || printf('%020.6f:%010d', tasks.position, tasks.id)
+        FROM tasks JOIN tree ON tasks.parentID = tree.id
+        -- a task that is its own ancestor would otherwise loop forever
+        WHERE tasks.id IS NOT :root
+    )
+'''
+
+
+@timed
+def get_task_tree(root_id=None):
+    """All tasks below `root_id` (itself included), or the whole hierarchy.
+
+    Each task dict carries its `depth`, 0 for the root(s).
+    """
+    conn = get_db_connection()
+    rows = conn.execute(TASK_TREE_SQL + '''
+        SELECT tasks.*, tree.depth FROM tree JOIN tasks ON tasks.id = tree.id
+        ORDER BY tree.path
+    ''', {'root': root_id}).fetchall()
+    return [dict(row) for row in rows]
 
-    # Set dueDate to NULL if it's None, otherwise keep the current value or the new value
-    new_dueDate = None if dueDate is None else dueDate
-    new_parentID = parentID if parentID is not None else task['parentID']
 
-    # Execute the SQL query
-    c.execute('''
-        UPDATE tasks
-        SET title = ?, description = ?, completed = ?, dueDate = ?, parentID = ?
-        WHERE id = ?
-    ''', (new_title, new_description, new_completed, new_dueDate, new_parentID, task_id))
+@timed
+def delete_task_tree(task_id):
+    """Delete a task and all of its descendants in one transaction.
 
-    conn.commit()
-    conn.close()
-    return True
+    Returns the ids of the deleted tasks (empty if the task did not exist).
+    """
+    if task_id is None:
+        return []
+    conn = get_db_connection()
+    with conn:
+        # Take the write lock first so the subtree cannot change between
+        # listing it and deleting it.
+        conn.execute('BEGIN IMMEDIATE')
+        ids = _delete_task_tree(conn, task_id)
+        _prune_tombstones(conn)
+    return ids
+
+
+def _delete_task_tree(conn, task_id):
+    ids = [row[0] for row in conn.execute(
+        TASK_TREE_SQL + 'SELECT id FROM tree', {'root': task_id})]
+    conn.execute(TASK_TREE_SQL + 'DELETE FROM tasks WHERE id IN (SELECT id FROM tree)',
+                 {'root': task_id})
+    return ids
+
+
+def _validate_task_op(index, op):
+    """Raise ValueError if batch operation `op` is malformed."""
+    if not isinstance(op, dict) or op.get('op') not in ('create', 'update', 'delete'):
+        raise ValueError(f"operation {index}: 'op' must be create, update or delete")
+    kind = op['op']
+    if kind != 'create' and (not isinstance(op.get('id'), int) or isinstance(op['id'], bool)):
+        raise ValueError(f"operation {index}: {kind} needs an integer 'id'")
+    if kind == 'delete':
+        return
+    if kind == 'create' and not (isinstance(op.get('title'), str) and op['title']):
+        raise ValueError(f"operation {index}: create needs a 'title'")
+    for name, value in op.items():
+        if name in ('op', 'id'):
+            continue
+        if name not in TASK_FIELDS:
+            raise ValueError(f"operation {index}: unknown field '{name}'")
+        # bool is an int subclass, but True is no task id
+        if not isinstance(value, TASK_FIELDS[name]) or (name == 'parentID' and isinstance(value, bool)):
+            raise ValueError(f"operation {index}: invalid value for '{name}'")
+
+
+@timed
+def apply_task_batch(ops):
+    """Apply a list of task operations atomically, in one transaction.
+
+    Each operation is a dict with 'op' set to 'create' (task fields, 'title'
+    required), 'update' ('id' and the fields to change) or 'delete' ('id';
+    removes the whole subtree). Returns one result per operation:
+    {'op', 'id'}, plus 'deleted' (all removed ids) for deletes. Raises
+    ValueError naming the first bad operation, in which case nothing is
+    applied.
+    """
+    if len(ops) > MAX_TASK_BATCH:
+        raise ValueError(f"at most {MAX_TASK_BATCH} operations per batch")
+    for index, op in enumerate(ops):
+        _validate_task_op(index, op)
+
+    results = []
+    conn = get_db_connection()
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        for index, op in enumerate(ops):
+            fields = {name: value for name, value in op.items() if name in TASK_FIELDS}
+            try:
+                if op['op'] == 'create':
+                    results.append({'op': 'create', 'id': _insert_task(conn, **fields)['id']})
+                elif op['op'] == 'update':
+                    if 'completed' in fields:
+                        fields['completed'] = int(fields['completed'])
+                    if fields.get('parentID') is not None and conn.execute(
+                            TASK_TREE_SQL + 'SELECT 1 FROM tree WHERE id = :parent',
+                            {'root': op['id'], 'parent': fields['parentID']}).fetchone():
+                        raise ValueError(f"operation {index}: task {op['id']} cannot be moved "
+                                         f"under itself or its subtasks")
+                    # `id = id` leaves the row (and its version) as it is
+                    assignments = ', '.join(f'{name} = ?' for name in fields) or 'id = id'
+                    if conn.execute(f'UPDATE tasks SET {assignments} WHERE id = ?',
+                                    [*fields.values(), op['id']]).rowcount == 0:
+                        raise ValueError(f"operation {index}: task {op['id']} not found")
+                    results.append({'op': 'update', 'id': op['id']})
+                else:
+                    deleted = _delete_task_tree(conn, op['id'])
+                    if not deleted:
+                        raise ValueError(f"operation {index}: task {op['id']} not found")
+                    results.append({'op': 'delete', 'id': op['id'], 'deleted': deleted})
+            except sqlite3.IntegrityError as e:
+                raise ValueError(f"operation {index}: {e}") from e
+        _prune_tombstones(conn)
+    return results
+
+
+def _prune_tombstones(conn):
+    """Keep the newest TOMBSTONE_LIMIT tombstones.
+
+    Clients last synced before the oldest one left get a full resync.
+    """
+    conn.execute('''
+        UPDATE task_sync SET min_version = COALESCE((
+            SELECT version FROM task_tombstones ORDER BY version DESC LIMIT 1 OFFSET ?
+        ), min_version)
+    ''', (TOMBSTONE_LIMIT,))
+    conn.execute('''
+        DELETE FROM task_tombstones WHERE version <= (SELECT min_version FROM task_sync)
+    ''')
 
 
-def delete_task(task_id):
+def _renumber_tasks(conn, ids):
+    """Give `ids` evenly spaced positions in list order, in one UPDATE."""
+    if not ids:
+        return
+    cases = ' '.join('WHEN ? THEN ?' for _ in ids)
+    params = [value for index, task_id in enumerate(ids)
+              for value in (task_id, (index + 1) * POSITION_GAP)]
+    conn.execute(
+        f"UPDATE tasks SET position = CASE id {cases} END "
+        f"WHERE id IN ({','.join('?' * len(ids))})",
+        params + list(ids))
+
+
+@timed
+def move_task(task_id, after_id=None, before_id=None):
+    """Move a task between two of its siblings.
+
+    `after_id` and `before_id` are the tasks that end up directly before and
+    after it; leave one out to move to the start or end of the list. Returns
+    the task's new position, or None if it or a neighbour is not in its list,
+    or a neighbour is the task itself.
+    """
+    if task_id in (after_id, before_id) or (after_id is not None and after_id == before_id):
+        return None
     conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('DELETE FROM tasks WHERE parentID = ?', (task_id,))
-    c.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
-    conn.commit()
-    changes = c.rowcount
-    conn.close()
-    return changes > 0  # Returns True if a row was deleted
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        task = conn.execute('SELECT parentID FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        if task is None:
+            return None
+
+        def neighbours():
+            rows = conn.execute(
+                'SELECT id, position FROM tasks WHERE id IN (?, ?) AND parentID IS ?',
+                (after_id, before_id, task['parentID'])).fetchall()
+            positions = {row['id']: row['position'] for row in rows}
+            return positions.get(after_id), positions.get(before_id)
+
+        after, before = neighbours()
+        if (after_id is not None and after is None) or (before_id is not None and before is None):
+            return None
+        if before is not None and before - (after or 0.0) < MIN_POSITION_GAP:
+            siblings = [row[0] for row in conn.execute(
+                'SELECT id FROM tasks WHERE parentID IS ? AND id != ? ORDER BY position, id',
+                (task['parentID'], task_id))]
+            _renumber_tasks(conn, siblings)
+            after, before = neighbours()
+
+        if before is None:
+            position = (after or 0.0) + POSITION_GAP
+        else:
+            position = ((after or 0.0) + before) / 2
+        conn.execute('UPDATE tasks SET position = ? WHERE id = ?', (position, task_id))
+    return position
 
 
+@timed
+def tasks_since(version):
+    """Task changes after `version`, read in one snapshot.
+
+    Returns a dict with the current `version`, the `tasks` written since and
+    the ids `deleted` since. When `version` is None, older than the oldest
+    kept tombstone or ahead of the database, `full` is True and `tasks` is
+    the whole hierarchy in tree order instead.
+    """
+    conn = get_db_connection()
+    with conn:
+        conn.execute('BEGIN')
+        current, min_version = conn.execute(
+            'SELECT version, min_version FROM task_sync').fetchone()
+        if version is None or version < min_version or version > current:
+            return {'version': current, 'since': None, 'full': True,
+                    'tasks': get_task_tree(), 'deleted': []}
+        tasks = conn.execute(
+            'SELECT * FROM tasks WHERE version > ? ORDER BY version', (version,)).fetchall()
+        deleted = conn.execute(
+            'SELECT id FROM task_tombstones WHERE version > ? ORDER BY version', (version,)).fetchall()
+    return {'version': current, 'since': version, 'full': False,
+            'tasks': [dict(row) for row in tasks], 'deleted': [row[0] for row in deleted]}
+
+
+@timed
 def get_subtasks(parent_id):
     conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('SELECT * FROM tasks WHERE parentID = ? ORDER BY id ASC', (parent_id,))
-    rows = c.fetchall()
-    conn.close()
+    rows = conn.execute(
+        'SELECT * FROM tasks WHERE parentID = ? ORDER BY position, id', (parent_id,)).fetchall()
     return [dict(row) for row in rows]
 
 
-def get_task_str(taskID):
-    task = get_task(taskID)
+def task_str(task):
+    """A task formatted for a prompt."""
     taskStr = f"Task ID: {task['id']}\nTitle: {task['title']}\nDescription: {task['description']}\nCompleted: {
         task['completed']}\nDue Date: {task['dueDate']}\nParent ID: {task['parentID']}"
     return taskStr
 
 
+@timed
 def db_query(sql, params=()):
     conn = get_db_connection()
     c = conn.cursor()
@@ -195,9 +642,13 @@ def db_query(sql, params=()):
     except sqlite3.Error as e:
         return f"An error occurred: {e}"
     finally:
-        conn.close()
+        # The connection outlives this call, so never leave a statement the
+        # model sneaked in here holding a write transaction open.
+        if conn.in_transaction:
+            conn.rollback()
 
 
+@timed
 def db_command(sql, params=()):
     conn = get_db_connection()
     c = conn.cursor()
@@ -221,6 +672,6 @@ def db_command(sql, params=()):
 
         return message
     except sqlite3.Error as e:
+        if conn.in_transaction:
+            conn.rollback()
         return f"An error occurred: {e}"
-    finally:
-        conn.close()
@@ -0,0 +1,152 @@
+# jobs.py
+import queue
+import threading
+import uuid
+
+from app import socketio
+from config import JOB_WORKERS, JOB_QUEUE_SIZE
+from tools.logging_utils import logger
+from tools.tracing import trace, trace_id
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once its client has cancelled it."""
+
+
+class Job:
+    def __init__(self, sid, kind, fn, args):
+        self.id = uuid.uuid4().hex
+        self.sid = sid
+        self.kind = kind
+        self.fn = fn
+        self.args = args
+        self.state = 'queued'
+        # The job's log lines carry the trace id of the request that queued it.
+        self.trace_id = trace_id.get()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+    def emit(self, event, data):
+        """Send an event to the session that submitted the job.
+
+        Doubles as a cancellation point, so long-running jobs that report
+        progress stop at their next update once cancelled.
+        """
+        self.check_cancelled()
+        socketio.emit(event, data, to=self.sid)
+        socketio.sleep(0)  # let the async server flush the event now
+
+
+class JobQueue:
+    """Bounded queue of socket jobs served by a fixed set of worker threads.
+
+    Socket handlers submit the slow part of their work (model and tool
+    calls) and return immediately; workers run it and emit the results to
+    the originating session.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_queue=JOB_QUEUE_SIZE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = {}  # queued or running jobs by id
+        self._lock = threading.Lock()
+        self._started = False
+        self._counts = {'submitted': 0, 'completed': 0,
+                        'failed': 0, 'cancelled': 0, 'rejected': 0}
+
+    def _start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(self.workers):
+            socketio.start_background_task(self._worker)
+
+    def submit(self, sid, kind, fn, *args):
+        """Queue fn(job, *args) for `sid`. Returns the Job, or None when full."""
+        self._start()
+        job = Job(sid, kind, fn, args)
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self._counts['rejected'] += 1
+                logger.warning(f"Job queue full, rejected {kind} for {sid}")
+                return None
+            self._jobs[job.id] = job
+            self._counts['submitted'] += 1
+        return job
+
+    def cancel(self, job_id, sid):
+        """Cancel a queued or running job owned by `sid`."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.sid != sid:
+            return False
+        job._cancelled.set()
+        return True
+
+    def cancel_session(self, sid):
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.sid == sid]
+        for job in jobs:
+            job._cancelled.set()
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values()
+                          if job.state == 'running')
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'queue_depth': self._queue.qsize(),
+                'running': running,
+                **self._counts,
+            }
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                with trace(job.trace_id):
+                    self._run(job)
+            finally:
+                with self._lock:
+                    self._jobs.pop(job.id, None)
+
+    def _run(self, job):
+        if job.cancelled:
+            self._finish(job, 'cancelled')
+            return
+        job.state = 'running'
+        try:
+            job.fn(job, *job.args)
+        except JobCancelled:
+            self._finish(job, 'cancelled')
+        except Exception as e:
+            logger.error(f"Job {job.kind} ({job.id}) failed: {e}")
+            self._finish(job, 'failed', error=str(e))
+        else:
+            self._finish(job, 'completed')
+
+    def _finish(self, job, state, error=None):
+        job.state = state
+        with self._lock:
+            self._counts[state] += 1
+        event = {'completed': 'job_finished', 'cancelled': 'job_cancelled',
+                 'failed': 'job_failed'}[state]
+        data = {'job_id': job.id, 'kind': job.kind}
+        if error:
+            data['error'] = error
+        socketio.emit(event, data, to=job.sid)
+
+
+jobs = JobQueue()
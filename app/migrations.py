@@ -0,0 +1,179 @@
+# migrations.py
+from datetime import datetime
+
+from tools.logging_utils import logger
+
+
+def _position_unplaced_tasks(conn):
+    # One row at a time, so each lands after the ones placed before it.
+    rows = conn.execute(
+        'SELECT id, parentID FROM tasks WHERE position IS NULL ORDER BY id').fetchall()
+    for task_id, parent_id in rows:
+        conn.execute('''
+            UPDATE tasks SET position = (
+                SELECT COALESCE(MAX(position), 0) + 1024 FROM tasks WHERE parentID IS ?
+            ) WHERE id = ?
+        ''', (parent_id, task_id))
+
+
+# Ordered schema changes applied on top of the base tables from init_db.
+# Each entry is (version, description, steps); a step is either an SQL
+# string or a callable taking the connection. Versions are never reused or
+# edited once shipped -- append a new entry instead.
+MIGRATIONS = [
+    (1, 'Index messages by channel', [
+        'CREATE INDEX IF NOT EXISTS idx_messages_channel_id ON messages (channel_id, id)',
+    ]),
+    (2, 'Index tasks by parent', [
+        'CREATE INDEX IF NOT EXISTS idx_tasks_parent_id ON tasks (parentID, id)',
+    ]),
+    (3, 'Rolling conversation summaries', [
+        '''
+        CREATE TABLE IF NOT EXISTS conversation_summaries (
+            channel_id TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            last_message_id INTEGER NOT NULL
+        )
+        ''',
+    ]),
+    (4, 'Track bulk memory ingestion progress', [
+        '''
+        CREATE TABLE IF NOT EXISTS ingested_chunks (
+            id TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            ingested_at TEXT NOT NULL
+        )
+        ''',
+    ]),
+    (5, 'Remove task subtrees orphaned by single-level deletes', [
+        # Required before foreign keys are enforced: updating a task whose
+        # parent no longer exists would otherwise fail.
+        '''
+        WITH RECURSIVE orphaned(id) AS (
+            SELECT id FROM tasks
+            WHERE parentID IS NOT NULL AND parentID NOT IN (SELECT id FROM tasks)
+            UNION ALL
+            SELECT tasks.id FROM tasks JOIN orphaned ON tasks.parentID = orphaned.id
+        )
+        DELETE FROM tasks WHERE id IN (SELECT id FROM orphaned)
+        ''',
+    ]),
+    (6, 'Order tasks by a sortable position', [
+        'ALTER TABLE tasks ADD COLUMN position REAL',
+        # Gaps of 1024 leave room for many moves before a list is renumbered.
+        'UPDATE tasks SET position = id * 1024',
+        'DROP INDEX IF EXISTS idx_tasks_parent_id',
+        'CREATE INDEX IF NOT EXISTS idx_tasks_parent_position ON tasks (parentID, position)',
+    ]),
+    (7, 'Version task changes for delta sync', [
+        # Every write to a task stamps it with the next value of a single
+        # counter; deletes leave a tombstone carrying that version instead.
+        '''
+        CREATE TABLE IF NOT EXISTS task_sync (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            min_version INTEGER NOT NULL
+        )
+        ''',
+        'INSERT INTO task_sync (id, version, min_version) VALUES (1, 1, 0)',
+        'ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 1',
+        'CREATE INDEX IF NOT EXISTS idx_tasks_version ON tasks (version)',
+        '''
+        CREATE TABLE IF NOT EXISTS task_tombstones (
+            id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_task_tombstones_version ON task_tombstones (version)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS tasks_version_insert AFTER INSERT ON tasks
+        BEGIN
+            UPDATE task_sync SET version = version + 1;
+            UPDATE tasks SET version = (SELECT version FROM task_sync) WHERE id = NEW.id;
+        END
+        ''',
+        # Listing the columns keeps the trigger's own version write from
+        # firing it again.
+        '''
+        CREATE TRIGGER IF NOT EXISTS tasks_version_update
+        AFTER UPDATE OF title, description, completed, dueDate, parentID, position ON tasks
+        BEGIN
+            UPDATE task_sync SET version = version + 1;
+            UPDATE tasks SET version = (SELECT version FROM task_sync) WHERE id = NEW.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS tasks_version_delete AFTER DELETE ON tasks
+        BEGIN
+            UPDATE task_sync SET version = version + 1;
+            INSERT OR REPLACE INTO task_tombstones (id, version)
+            VALUES (OLD.id, (SELECT version FROM task_sync));
+        END
+        ''',
+    ]),
+    (8, 'Position tasks inserted without one', [
+        # The task assistant inserts rows with plain SQL; put them at the end
+        # of their list like create_task does.
+        '''
+        CREATE TRIGGER IF NOT EXISTS tasks_default_position AFTER INSERT ON tasks
+        WHEN NEW.position IS NULL
+        BEGIN
+            UPDATE tasks SET position = (
+                SELECT COALESCE(MAX(position), 0) + 1024 FROM tasks
+                WHERE parentID IS NEW.parentID AND id != NEW.id
+            ) WHERE id = NEW.id;
+        END
+        ''',
+        _position_unplaced_tasks,
+    ]),
+]
+
+
+def get_schema_version(conn):
+    row = conn.execute(
+        'SELECT MAX(version) FROM schema_migrations').fetchone()
+    return row[0] or 0
+
+
+def migrate(conn):
+    """Apply every migration newer than the database's recorded version.
+
+    Each migration runs in its own write transaction together with its
+    bookkeeping row, so a failure leaves the schema at the last good version.
+    Returns the resulting schema version.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+
+    for version, description, steps in MIGRATIONS:
+        if version <= get_schema_version(conn):
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have migrated while we waited for the lock.
+            if version <= get_schema_version(conn):
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute('''
+                INSERT INTO schema_migrations (version, description, applied_at)
+                VALUES (?, ?, ?)
+            ''', (version, description, datetime.now().isoformat()))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.error(f"Migration {version} ({description}) failed")
+            raise
+        logger.info(f"Applied migration {version}: {description}")
+
+    return get_schema_version(conn)
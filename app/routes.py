@@ -1,32 +1,133 @@
 # routes.py
-from flask import render_template, current_app as app
+import sqlite3
+from functools import wraps
+
+from flask import Response, render_template, request, current_app as app
 from app import socketio
 from flask_socketio import emit
 from app.db import (
+    MESSAGE_PAGE_SIZE,
+    apply_task_batch,
     init_db,
     store_message,
-    get_message_history,
+    get_message_page,
     clear_message_history,
     create_task,
     get_all_tasks,
     get_subtasks,
-    get_task,
-    update_task,
-    delete_task,
-    get_task_str
+    task_str,
+    move_task,
+    tasks_since
 )
 import app.ai.raven as raven
+import app.task_repository as task_repository
+from app.task_repository import task_scope
+from app.ai.context import build_chat_context, fold_older_messages
+from app.ai.memory import embedding_cache_stats
+from app.ai.ingest import ingest, parse_jsonl, parse_records
+from app.jobs import jobs
+from tools.metrics import render_metrics, tool_stats
+from tools.tracing import trace
 from tools.logging_utils import logger
+from config import STREAM_RESPONSES
+
+
+BUSY_MESSAGE = "My ravens are all out on errands. Please try again in a moment."
+
+
+def socket_event(event):
+    """Register a socket handler that runs under a fresh trace id.
+
+    Task reads within one event share an identity map (see task_repository).
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def traced(*args):
+            with trace(), task_scope():
+                return handler(*args)
+        return socketio.on(event)(traced)
+    return decorator
+
+
+def stream_emitter(job, event):
+    """Build an on_token callback that forwards model output to the job's client."""
+    if not STREAM_RESPONSES:
+        return None
+
+    def on_token(text):
+        job.emit(event, {'type': 'chunk', 'message_id': job.id, 'content': text})
+
+    return on_token
+
+
+def submit_job(kind, fn, *args):
+    """Queue slow work for the current session and tell the client about it."""
+    job = jobs.submit(request.sid, kind, fn, *args)
+    if job is None:
+        emit('job_rejected', {'kind': kind, 'message': BUSY_MESSAGE})
+        return None
+    emit('job_queued', {'job_id': job.id, 'kind': kind, 'trace_id': job.trace_id,
+         'queue_depth': jobs.stats()['queue_depth']})
+    return job
 
 
 @app.route('/')
 def home():
     channel_id = 'general'  # Adjust as necessary
-    messages = get_message_history(channel_id)
-    return render_template('index.html', messages=messages, channel=channel_id)
+    messages = get_message_page(channel_id)
+    return render_template('index.html', messages=messages, channel=channel_id,
+                           has_more=len(messages) == MESSAGE_PAGE_SIZE)
+
+
+@app.route('/jobs')
+def job_stats():
+    return jobs.stats()
+
+
+@app.route('/tools')
+def tool_call_stats():
+    return tool_stats()
+
 
+@app.route('/caches')
+def cache_stats():
+    return {'embeddings': embedding_cache_stats(),
+            'online_search': raven.search_cache.stats()}
 
-@socketio.on('send_message')
+
+@app.route('/metrics')
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+@socket_event('cancel_job')
+def handle_cancel_job(data):
+    if not jobs.cancel(data.get('job_id'), request.sid):
+        emit('error', {'message': 'Job not found.'})
+
+
+@socket_event('disconnect')
+def handle_disconnect():
+    jobs.cancel_session(request.sid)
+
+
+@socket_event('load_older_messages')
+def handle_load_older_messages(data):
+    channel_id = data.get('channel_id')
+    before_id = data.get('before_id')
+    if not channel_id or before_id is None:
+        emit('error', {'message': 'Channel and message ID are required.'})
+        return
+
+    messages = get_message_page(channel_id, before_id)
+    emit('older_messages', {
+        'channel_id': channel_id,
+        'messages': messages,
+        'has_more': len(messages) == MESSAGE_PAGE_SIZE,
+    })
+
+
+@socket_event('send_message')
 def handle_send_message(data):
     channel_id = data['channel_id']
     message_content = data['message_content']
@@ -39,23 +140,10 @@ def handle_send_message(data):
         return
 
     if message_content.startswith('/t'):
-        tasks = get_all_tasks()
-        if not tasks:
+        if not get_all_tasks():
             create_task('New Task')
-            tasks = get_all_tasks()
-        formatted_tasks = [
-            {
-                'id': task['id'],
-                'title': task['title'],
-                'description': task['description'],
-                'completed': bool(task['completed']),
-                'dueDate': task['dueDate'],
-                'parentID': task['parentID'],
-            }
-            for task in tasks
-        ]
-        emit('tasks_data', {'taskdata': {
-             'name': 'My Tasks', 'tasks': formatted_tasks}})
+        # The client fills the list from its synced copy of the tasks
+        emit('tasks_data', {'taskdata': {'name': 'My Tasks', 'parentID': None}})
         return
 
     store_message(channel_id, 'human', message_content)
@@ -63,16 +151,99 @@ def handle_send_message(data):
     user_message = {'role': 'human', 'content': message_content}
     emit('receive_message', {'type': 'message', 'user_message': user_message})
 
+    submit_job('send_message', run_chat_job, channel_id)
+
+
+def run_chat_job(job, channel_id):
+    summary, window = build_chat_context(channel_id)
     response_message = raven.general_chat_raven(
-        get_message_history(channel_id))
+        window, summary, on_token=stream_emitter(job, 'receive_message'),
+        check_cancelled=job.check_cancelled)
+    job.check_cancelled()
 
     store_message(channel_id, 'ai', response_message)
 
     ai_message = {'role': 'ai', 'content': response_message}
-    emit('receive_message', {'type': 'response', 'ai_message': ai_message})
+    job.emit('receive_message', {'type': 'response',
+             'message_id': job.id, 'ai_message': ai_message})
+
+    # Done after replying so summarizing never delays the response. A failure
+    # here must not fail the job: the reply was already delivered, and the
+    # next message retries from the last saved summary.
+    if window:
+        try:
+            fold_older_messages(channel_id, window[0]['id'])
+        except Exception as e:
+            logger.error(f"Folding older messages of {channel_id} failed: {e}")
+
+
+@socket_event('ingest_memory')
+def handle_ingest_memory(data):
+    source = data.get('source', 'upload')
+    try:
+        if data.get('jsonl'):
+            items = parse_jsonl(data['jsonl'].splitlines(), source)
+        else:
+            items = parse_records(data.get('documents', []), source)
+    except ValueError as e:
+        emit('error', {'message': f'Invalid ingest payload: {e}'})
+        return
+
+    if not items:
+        emit('error', {'message': 'Nothing to ingest.'})
+        return
 
+    submit_job('ingest_memory', run_ingest_job, items)
 
-@socketio.on('create_task')
+
+def run_ingest_job(job, items):
+    # Progress events double as cancellation points between batches; a
+    # cancelled run resumes from the last written batch when resubmitted.
+    status = ingest(items, progress=lambda status: job.emit(
+        'ingest_progress', {'job_id': job.id, **status}))
+    job.emit('ingest_complete', {'job_id': job.id, **status})
+
+
+def format_task(task):
+    formatted = {
+        'id': task['id'],
+        'title': task['title'],
+        'description': task['description'],
+        'completed': bool(task['completed']),
+        'dueDate': task['dueDate'],
+        'parentID': task['parentID'],
+        'position': task['position'],
+    }
+    if 'depth' in task:
+        formatted['depth'] = task['depth']
+    return formatted
+
+
+def emit_tasks_delta(data, written=None, **extra):
+    """Send the client the task changes after the version it last saw.
+
+    `written` is a task just returned by a single-row write; if the client
+    was up to date before it, it is the whole delta and nothing is queried.
+    """
+    version = data.get('version')
+    if written is not None and version is not None and written['version'] == version + 1:
+        delta = {'version': written['version'], 'since': version, 'full': False,
+                 'tasks': [written], 'deleted': []}
+    else:
+        delta = tasks_since(version)
+    emit('tasks_delta', tasks_delta_event(delta, **extra))
+
+
+def tasks_delta_event(delta, **extra):
+    return {**delta, 'tasks': [format_task(task) for task in delta['tasks']], **extra}
+
+
+@socket_event('tasks_sync')
+def handle_tasks_sync(data):
+    emit_tasks_delta(data or {})
+
+
+@socket_event('create_task')
 def handle_create_task(data):
     title = data.get('title')
     description = data.get('description', '')
@@ -84,20 +255,15 @@ def handle_create_task(data):
         emit('error', {'message': 'Task title is required.'})
         return
 
-    task_id = create_task(title, description, completed, dueDate, parentID)
-    new_task = get_task(task_id)
-    formatted_task = {
-        'id': new_task['id'],
-        'title': new_task['title'],
-        'description': new_task['description'],
-        'completed': bool(new_task['completed']),
-        'dueDate': new_task['dueDate'],
-        'parentID': new_task['parentID'],
-    }
-    emit('task_created', {'task': formatted_task})
+    try:
+        task = task_repository.create(title, description, completed, dueDate, parentID)
+    except sqlite3.IntegrityError:
+        emit('error', {'message': 'Parent task not found.'})
+        return
+    emit_tasks_delta(data, task)
 
 
-@socketio.on('update_task')
+@socket_event('update_task')
 def handle_update_task(data):
     task_id = data.get('id')
     if not task_id:
@@ -110,128 +276,92 @@ def handle_update_task(data):
     dueDate = data.get('dueDate')
     parentID = data.get('parentID')
 
-    success = update_task(task_id, title, description,
-                          completed, dueDate, parentID)
-    if success:
-        updated_task = get_task(task_id)
-        formatted_task = {
-            'id': updated_task['id'],
-            'title': updated_task['title'],
-            'description': updated_task['description'],
-            'completed': bool(updated_task['completed']),
-            'dueDate': updated_task['dueDate'],
-            'parentID': updated_task['parentID'],
-        }
-        emit('task_updated', {'task': formatted_task})
+    try:
+        task = task_repository.update(task_id, title, description,
+                                      completed, dueDate, parentID)
+    except sqlite3.IntegrityError:
+        emit('error', {'message': 'Parent task not found.'})
+        return
+    if task:
+        emit_tasks_delta(data, task)
     else:
         emit('error', {'message': 'Task not found.'})
 
 
-@socketio.on('delete_task')
+@socket_event('delete_task')
 def handle_delete_task(data):
     task_id = data.get('id')
     if not task_id:
         emit('error', {'message': 'Task ID is required.'})
         return
 
-    success = delete_task(task_id)
-    if success:
-        emit('task_deleted', {'id': task_id})
+    if task_repository.delete_tree(task_id):
+        emit_tasks_delta(data)
     else:
         emit('error', {'message': 'Task not found.'})
 
 
-@socketio.on('get_parent_tasks')
-def handle_get_parent_tasks(data):
-    parentID = data.get('parentID')
-    parentTask = get_task(parentID)
-    name = "My Tasks"
-    if (parentTask['parentID'] is None):
-        tasks = get_all_tasks()
-    else:
-        tasks = get_subtasks(parentTask.get('id'))
-        name = parentTask['title']
-    formatted_tasks = [
-        {
-            'id': task['id'],
-            'title': task['title'],
-            'description': task['description'],
-            'completed': bool(task['completed']),
-            'dueDate': task['dueDate'],
-            'parentID': task['parentID'],
-        }
-        for task in tasks
-    ]
-    emit('tasks_data', {'taskdata': {
-         'name': name, 'tasks': formatted_tasks}})
-
-
-@socketio.on('get_sub_tasks')
+@socket_event('tasks_batch')
+def handle_tasks_batch(data):
+    ops = data.get('ops')
+    if not isinstance(ops, list) or not ops:
+        emit('error', {'message': 'A list of task operations is required.'})
+        return
+
+    try:
+        results = apply_task_batch(ops)
+    except ValueError as e:
+        emit('error', {'message': f'Invalid task batch: {e}'})
+        return
+    emit_tasks_delta(data, results=results)
+
+
+@socket_event('get_sub_tasks')
 def handle_get_sub_tasks(data):
     parentID = data.get('parentID')
-    parentTask = get_task(parentID)
-    tasks = get_subtasks(parentID)
-    if not tasks:
-        create_task('New Task', parentID=parentID)
-        tasks = get_subtasks(parentID)
-    formatted_tasks = [
-        {
-            'id': task['id'],
-            'title': task['title'],
-            'description': task['description'],
-            'completed': bool(task['completed']),
-            'dueDate': task['dueDate'],
-            'parentID': task['parentID'],
-        }
-        for task in tasks
-    ]
-    emit('tasks_data', {'taskdata': {
-         'name': parentTask['title'], 'tasks': formatted_tasks}})
-
-
-@socketio.on('flip_tasks')
-def handle_flip_tasks(data):
-    task_id1 = data.get('id1')
-    task_id2 = data.get('id2')
-    task1 = get_task(task_id1)
-    task2 = get_task(task_id2)
-    update_task(task_id1, title=task2['title'], description=task2['description'], completed=task2['completed'],
-                dueDate=task2['dueDate'], parentID=task2['parentID'])
-    update_task(task_id2, title=task1['title'], description=task1['description'], completed=task1['completed'],
-                dueDate=task1['dueDate'], parentID=task1['parentID'])
-    taskName = "My Tasks"
-    if task1['parentID'] is None:
-        tasks = get_all_tasks()
-    else:
-        parentTask = get_task(task1['parentID'])
-        tasks = get_subtasks(task1['parentID'])
-        taskName = parentTask['title']
-    formatted_tasks = [
-        {
-            'id': task['id'],
-            'title': task['title'],
-            'description': task['description'],
-            'completed': bool(task['completed']),
-            'dueDate': task['dueDate'],
-            'parentID': task['parentID'],
-        }
-        for task in tasks
-    ]
-    emit('tasks_data', {'taskdata': {
-         'name': taskName, 'tasks': formatted_tasks}})
-
-
-@socketio.on('ai_message_task')
+    task = None
+    if not get_subtasks(parentID):
+        try:
+            task = task_repository.create('New Task', parentID=parentID)
+        except sqlite3.IntegrityError:
+            emit('error', {'message': 'Task not found.'})
+            return
+    emit_tasks_delta(data, task)
+
+
+@socket_event('move_task')
+def handle_move_task(data):
+    task_id = data.get('id')
+    if not task_id:
+        emit('error', {'message': 'Task ID is required.'})
+        return
+
+    if move_task(task_id, data.get('afterID'), data.get('beforeID')) is None:
+        emit('error', {'message': 'Task or its new neighbours not found.'})
+        return
+    emit_tasks_delta(data)
+
+
+@socket_event('ai_message_task')
 def handle_ai_message_task(data):
     tasks = data.get('tasks')
     logger.debug(f"Tasks: {tasks}")
     logger.debug(f"Message: {data.get('message')}")
-    tasks_info = ""
-    if tasks:
-        for task in tasks:
-            tasks_info += get_task_str(task)+'\n\n'
-    response_message = raven.task_talk(data.get('message'), tasks_info)
-    emit('ai_task_response', {'message': response_message})
+    # One query for the whole visible list, read when the message is sent
+    tasks_info = ''.join(task_str(task) + '\n\n' for task in task_repository.get_many(tasks or []))
+    submit_job('ai_message_task', run_task_talk_job, data.get('message'), tasks_info,
+               data.get('version'))
+
+
+def run_task_talk_job(job, message, tasks_info, version):
+    response_message = raven.task_talk(
+        message, tasks_info,
+        on_token=stream_emitter(job, 'ai_task_response_chunk'),
+        check_cancelled=job.check_cancelled)
+    job.emit('ai_task_response', {'message_id': job.id,
+             'message': response_message})
+    # task_talk changes tasks with raw SQL, so send the client what it missed
+    job.emit('tasks_delta', tasks_delta_event(tasks_since(version)))
 
 
 if __name__ == '__main__':
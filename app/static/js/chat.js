@@ -1,27 +1,157 @@
 var ActiveTaskList = null;
 
-const initializeChat = (messages, channelId) => {
+const initializeChat = (messages, channelId, hasMoreHistory) => {
   $(document).ready(() => {
     const socket = io();
     const chatArea = $("#chat-area");
+    const scrollArea = chatArea.closest(".chat-box-container");
+
+    // Oldest message currently rendered; older pages are requested by id.
+    let oldestMessageId = messages.length ? messages[0].id : null;
+    let loadingOlder = false;
 
     socket.emit("join", { channel_id: channelId });
 
-    const appendMessageToChat = (type, content) => {
+    const renderMessage = (type, content) => {
       const sanitizedContent = DOMPurify.sanitize(marked.parse(content));
-      chatArea.append(`<div class="message ${type}">${sanitizedContent}</div>`);
+      return `<div class="message ${type}">${sanitizedContent}</div>`;
+    };
+
+    const appendMessageToChat = (type, content) => {
+      chatArea.append(renderMessage(type, content));
       // Scroll to the bottom after appending new message
       chatArea.scrollTop(chatArea[0].scrollHeight);
     };
 
-    socket.on("receive_message", ({ type, ai_message, user_message, error_message }) => {
+    // Replies being streamed, keyed by message id
+    const streamingMessages = {};
+
+    const appendStreamChunk = (messageId, content) => {
+      let stream = streamingMessages[messageId];
+      if (!stream) {
+        const element = $('<div class="message ai streaming"></div>');
+        chatArea.append(element);
+        stream = streamingMessages[messageId] = { element, text: "", pending: false, done: false };
+      }
+      stream.text += content;
+      // Re-render at most once per frame however fast chunks arrive
+      if (stream.pending) return;
+      stream.pending = true;
+      requestAnimationFrame(() => {
+        stream.pending = false;
+        if (stream.done) return;
+        stream.element.html(DOMPurify.sanitize(marked.parse(stream.text)));
+        chatArea.scrollTop(chatArea[0].scrollHeight);
+        scrollArea.scrollTop(scrollArea[0].scrollHeight);
+      });
+    };
+
+    // Chat job currently being answered by the server, if any
+    let activeJobId = null;
+    const stopButton = $("#stop-button");
+
+    const setActiveJob = (jobId) => {
+      activeJobId = jobId;
+      stopButton.toggleClass("d-none", jobId === null);
+    };
+
+    stopButton.on("click", () => {
+      if (activeJobId) socket.emit("cancel_job", { job_id: activeJobId });
+    });
+
+    socket.on("job_queued", ({ job_id, kind }) => {
+      if (kind === "send_message") setActiveJob(job_id);
+    });
+
+    socket.on("job_rejected", ({ kind, message }) => {
+      if (kind === "ai_message_task" && ActiveTaskList) {
+        ActiveTaskList.displayMessage(message, "ai-message");
+      } else {
+        appendMessageToChat("ai", message);
+      }
+    });
+
+    socket.on("job_finished", ({ job_id }) => {
+      if (job_id === activeJobId) setActiveJob(null);
+    });
+
+    socket.on("job_cancelled", ({ job_id }) => {
+      const stream = streamingMessages[job_id];
+      if (stream) {
+        delete streamingMessages[job_id];
+        stream.done = true;
+        stream.element.removeClass("streaming").addClass("cancelled");
+      }
+      if (job_id === activeJobId) setActiveJob(null);
+    });
+
+    socket.on("job_failed", ({ job_id, kind }) => {
+      const message = "Something went wrong while I was working on that.";
+      if (kind === "ai_message_task" && ActiveTaskList) {
+        ActiveTaskList.finishStream(job_id, message);
+      } else {
+        finishStream(job_id, message);
+      }
+      if (job_id === activeJobId) setActiveJob(null);
+    });
+
+    const finishStream = (messageId, content) => {
+      const stream = streamingMessages[messageId];
+      if (!stream) {
+        appendMessageToChat("ai", content);
+        return;
+      }
+      delete streamingMessages[messageId];
+      stream.done = true; // drop any queued partial render
+      stream.element.removeClass("streaming").html(DOMPurify.sanitize(marked.parse(content)));
+      chatArea.scrollTop(chatArea[0].scrollHeight);
+    };
+
+    const prependMessagesToChat = (olderMessages) => {
+      // Keep the message the user is looking at in place while the page grows above it
+      const previousHeight = scrollArea[0].scrollHeight;
+      const html = olderMessages.map(({ role, content }) => renderMessage(role === "ai" ? "ai" : "human", content));
+      chatArea.prepend(html.join(""));
+      scrollArea.scrollTop(scrollArea.scrollTop() + scrollArea[0].scrollHeight - previousHeight);
+    };
+
+    const loadOlderMessages = () => {
+      if (loadingOlder || !hasMoreHistory || oldestMessageId === null) return;
+      loadingOlder = true;
+      socket.emit("load_older_messages", { channel_id: channelId, before_id: oldestMessageId });
+    };
+
+    // Pull in older pages until the history is scrollable or exhausted
+    const fillViewport = () => {
+      if (scrollArea[0].scrollHeight <= scrollArea[0].clientHeight) loadOlderMessages();
+    };
+
+    scrollArea.on("scroll", () => {
+      if (scrollArea.scrollTop() < 50) loadOlderMessages();
+    });
+
+    socket.on("older_messages", (data) => {
+      loadingOlder = false;
+      if (data.channel_id !== channelId) return;
+      hasMoreHistory = data.has_more;
+      if (data.messages.length) {
+        oldestMessageId = data.messages[0].id;
+        prependMessagesToChat(data.messages);
+      }
+      fillViewport();
+    });
+
+    socket.on("receive_message", ({ type, message_id, content, ai_message, user_message, error_message }) => {
       switch (type) {
         case "reset":
           chatArea.empty();
           appendMessageToChat("ai", "Thank you, how can I help you?");
           break;
+        case "chunk":
+          appendStreamChunk(message_id, content);
+          break;
         case "response":
-          appendMessageToChat("ai", ai_message.content);
+          finishStream(message_id, ai_message.content);
           break;
         case "message":
           appendMessageToChat("human", user_message.content);
@@ -31,6 +161,8 @@ const initializeChat = (messages, channelId) => {
           break;
         case "clear":
           chatArea.empty();
+          oldestMessageId = null;
+          hasMoreHistory = false;
           break;
         default:
           console.log("Unrecognized type", type);
@@ -51,26 +183,18 @@ const initializeChat = (messages, channelId) => {
       });
     });
 
-    socket.on("task_created", (data) => {
-      const task = data.task;
-      ActiveTaskList.taskData.tasks = ActiveTaskList.taskData.tasks.concat(task);
-      ActiveTaskList.renderTasks(ActiveTaskList.taskData.tasks);
-    });
-
-    socket.on("task_updated", (data) => {
-      const task = data.task;
-      const index = ActiveTaskList.taskData.tasks.findIndex((t) => t.id === task.id);
-      ActiveTaskList.taskData.tasks[index] = task;
-      ActiveTaskList.renderTasks(ActiveTaskList.taskData.tasks);
+    socket.on("tasks_delta", (data) => {
+      if (TaskTree.apply(data) && ActiveTaskList) {
+        ActiveTaskList.refresh();
+      }
     });
 
-    socket.on("task_deleted", (data) => {
-      ActiveTaskList.taskData.tasks = ActiveTaskList.taskData.tasks.filter((t) => t.id !== data.id);
-      ActiveTaskList.renderTasks(ActiveTaskList.taskData.tasks);
+    socket.on("ai_task_response_chunk", (data) => {
+      ActiveTaskList.appendStreamChunk(data.message_id, data.content);
     });
 
     socket.on("ai_task_response", (data) => {
-      ActiveTaskList.displayMessage(data.message, "ai-message");
+      ActiveTaskList.finishStream(data.message_id, data.message);
     });
 
     const sendMessage = () => {
@@ -94,6 +218,8 @@ const initializeChat = (messages, channelId) => {
     });
 
     chatArea.scrollTop(chatArea[0].scrollHeight);
+    scrollArea.scrollTop(scrollArea[0].scrollHeight);
+    fillViewport();
 
     $("#message-input").keydown((event) => {
       if (event.keyCode === 13 && !event.shiftKey) {
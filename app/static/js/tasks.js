@@ -1,10 +1,58 @@
 // task.js
 
+// Client-side copy of the whole task hierarchy, kept current by the
+// "tasks_delta" events the server answers every task change with, so moving
+// between levels needs no round trip. `version` is the last change applied.
+const TaskTree = {
+  loaded: false,
+  version: null,
+  tasksById: new Map(),
+
+  load(tasks) {
+    this.tasksById.clear();
+    tasks.forEach((task) => this.put(task));
+    this.loaded = true;
+  },
+
+  // Apply a delta unless a newer one was already applied. Returns whether it was.
+  apply(delta) {
+    if (delta.full) {
+      this.load(delta.tasks);
+    } else if (this.loaded && delta.version > this.version) {
+      delta.tasks.forEach((task) => this.put(task));
+      this.remove(delta.deleted);
+    } else {
+      return false;
+    }
+    this.version = delta.version;
+    return true;
+  },
+
+  put(task) {
+    const { depth, ...fields } = task;
+    this.tasksById.set(task.id, { ...this.tasksById.get(task.id), ...fields });
+  },
+
+  remove(ids) {
+    ids.forEach((id) => this.tasksById.delete(id));
+  },
+
+  get(id) {
+    return this.tasksById.get(id) || null;
+  },
+
+  children(parentID) {
+    return [...this.tasksById.values()]
+      .filter((task) => task.parentID === parentID)
+      .sort((a, b) => a.position - b.position || a.id - b.id);
+  },
+};
+
 class TaskList {
   constructor({ container, taskData, socket }) {
     this.container = container; // HTML element to render into
-    this.taskData = taskData; // Initial tasks data
-    this.parentID = null; // Tracks current parent task for subtasks
+    this.parentID = taskData.parentID ?? null; // Tracks current parent task for subtasks
+    this.taskData = { name: taskData.name, tasks: TaskTree.children(this.parentID) };
     this.currentTaskIdForDate = null; // Tracks task ID for due date editing
     this.socket = socket; // Socket.io instance
 
@@ -15,6 +63,8 @@ class TaskList {
     this.render();
     this.setupEventListeners();
     this.setupSocketListeners();
+
+    this.socket.emit("tasks_sync", { version: TaskTree.version });
   }
 
   setupEventListeners() {
@@ -158,7 +208,6 @@ class TaskList {
     this.taskListElement.innerHTML = "";
 
     tasks.forEach((task) => {
-      this.parentID = task.parentID;
       const taskItem = this.createTaskElement(task);
       this.taskListElement.appendChild(taskItem);
     });
@@ -349,15 +398,34 @@ class TaskList {
       completed: false,
       dueDate: null,
       parentID: this.parentID, // Assign current parentID if any
+      version: TaskTree.version,
     };
     this.socket.emit("create_task", newTask);
   };
 
   handleGoBack = () => {
     if (this.parentID === null) return; // Already at top-level
-    this.socket.emit("get_parent_tasks", { parentID: this.parentID });
+    const parentTask = TaskTree.get(this.parentID);
+    if (parentTask) {
+      this.showLevel(parentTask.parentID);
+    }
   };
 
+  // Render the children of parentID from the cached tree
+  showLevel(parentID) {
+    const name = parentID === null ? "My Tasks" : TaskTree.get(parentID)?.title;
+    this.taskData = { name, tasks: TaskTree.children(parentID) };
+    this.parentID = parentID;
+    this.renderTasks(this.taskData.tasks);
+    this.updateTaskTitle();
+  }
+
+  // Re-render the current level after the cache changed
+  refresh() {
+    const current = this.parentID !== null && !TaskTree.get(this.parentID) ? null : this.parentID;
+    this.showLevel(current);
+  }
+
   handleClose = () => {
     this.container.style.display = "none";
   };
@@ -376,7 +444,7 @@ class TaskList {
     for (const task of this.taskData.tasks) {
       task_ids.push(task.id);
     }
-    this.socket.emit("ai_message_task", { message, tasks: task_ids });
+    this.socket.emit("ai_message_task", { message, tasks: task_ids, version: TaskTree.version });
   };
 
   displayMessage(message, className) {
@@ -387,8 +455,35 @@ class TaskList {
     this.chatContainer.scrollTop = this.chatContainer.scrollHeight;
   }
 
+  appendStreamChunk(messageId, content) {
+    let messageDiv = this.chatContainer.querySelector(`[data-message-id='${messageId}']`);
+    if (!messageDiv) {
+      messageDiv = document.createElement("div");
+      messageDiv.className = "chat-message ai-message streaming";
+      messageDiv.dataset.messageId = messageId;
+      this.chatContainer.appendChild(messageDiv);
+    }
+    messageDiv.textContent += content;
+    this.chatContainer.scrollTop = this.chatContainer.scrollHeight;
+  }
+
+  finishStream(messageId, message) {
+    const messageDiv = this.chatContainer.querySelector(`[data-message-id='${messageId}']`);
+    if (!messageDiv) {
+      this.displayMessage(message, "ai-message");
+      return;
+    }
+    messageDiv.classList.remove("streaming");
+    messageDiv.textContent = message;
+    this.chatContainer.scrollTop = this.chatContainer.scrollHeight;
+  }
+
   viewSubtasks = (taskId) => {
-    this.socket.emit("get_sub_tasks", { parentID: taskId });
+    this.showLevel(taskId);
+    // Empty levels go to the server, which adds a first subtask
+    if (this.taskData.tasks.length === 0) {
+      this.socket.emit("get_sub_tasks", { parentID: taskId, version: TaskTree.version });
+    }
   };
 
   toggleComplete = (event, taskId) => {
@@ -428,11 +523,11 @@ class TaskList {
   };
 
   updateTask(taskId, updatedData) {
-    this.socket.emit("update_task", { id: taskId, ...updatedData });
+    this.socket.emit("update_task", { id: taskId, ...updatedData, version: TaskTree.version });
   }
 
   deleteTask(taskId) {
-    this.socket.emit("delete_task", { id: taskId });
+    this.socket.emit("delete_task", { id: taskId, version: TaskTree.version });
   }
 
   formatDate(dateString) {
@@ -460,13 +555,21 @@ class TaskList {
 
   updateTaskOrder = (evt) => {
     const movedTaskId = Number(evt.item.dataset.id);
-    const newIndex = evt.newIndex;
-
-    const currentTasks = [...this.taskData.tasks];
-    const movedTaskIndex = currentTasks.findIndex((task) => task.id === movedTaskId);
-    if (movedTaskIndex === -1) return;
-
-    const [movedTask] = currentTasks.splice(movedTaskIndex, 1);
-    this.socket.emit("flip_tasks", { id1: movedTaskId, id2: currentTasks[newIndex].id });
+    const previous = evt.item.previousElementSibling;
+    const next = evt.item.nextElementSibling;
+
+    // Keep the local list in the order now shown; the server only stores the
+    // moved task's new position between its neighbours.
+    const movedTaskIndex = this.taskData.tasks.findIndex((task) => task.id === movedTaskId);
+    if (movedTaskIndex === -1 || evt.oldIndex === evt.newIndex) return;
+    const [movedTask] = this.taskData.tasks.splice(movedTaskIndex, 1);
+    this.taskData.tasks.splice(evt.newIndex, 0, movedTask);
+
+    this.socket.emit("move_task", {
+      id: movedTaskId,
+      afterID: previous ? Number(previous.dataset.id) : null,
+      beforeID: next ? Number(next.dataset.id) : null,
+      version: TaskTree.version,
+    });
   };
 }
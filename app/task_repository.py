@@ -0,0 +1,67 @@
+# task_repository.py
+import contextvars
+from contextlib import contextmanager
+
+from app import db
+
+# Tasks read or written during the current socket event, by id, so repeated
+# reads within one event cost no queries. None outside task_scope().
+_identity_map = contextvars.ContextVar('task_identity_map', default=None)
+
+
+@contextmanager
+def task_scope():
+    """Share one identity map across the reads and writes of the block."""
+    token = _identity_map.set({})
+    try:
+        yield
+    finally:
+        _identity_map.reset(token)
+
+
+def _remember(task):
+    tasks = _identity_map.get()
+    if tasks is not None and task is not None:
+        tasks[task['id']] = task
+    return task
+
+
+def get(task_id):
+    tasks = get_many([task_id])
+    return tasks[0] if tasks else None
+
+
+def get_many(ids):
+    """The tasks with the given ids, in that order, skipping unknown ids.
+
+    Ids not already in the identity map are loaded with one query.
+    """
+    ids = list(ids)
+    tasks = _identity_map.get()
+    if tasks is None:
+        tasks = {}
+    missing = [task_id for task_id in dict.fromkeys(ids) if task_id not in tasks]
+    if missing:
+        for task in db.get_tasks(missing).values():
+            _remember(task)
+            tasks.setdefault(task['id'], task)
+    return [tasks[task_id] for task_id in ids if task_id in tasks]
+
+
+def create(title, description='', completed=False, dueDate=None, parentID=None):
+    return _remember(db.create_task(title, description, completed, dueDate, parentID))
+
+
+def update(task_id, title=None, description=None, completed=None, dueDate=None, parentID=None):
+    """The updated task, or None if it does not exist."""
+    return _remember(db.update_task(task_id, title, description, completed, dueDate, parentID))
+
+
+def delete_tree(task_id):
+    """Delete a task and its descendants; returns the deleted ids."""
+    ids = db.delete_task_tree(task_id)
+    tasks = _identity_map.get()
+    if tasks is not None:
+        for deleted_id in ids:
+            tasks.pop(deleted_id, None)
+    return ids
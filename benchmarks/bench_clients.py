@@ -0,0 +1,113 @@
+"""Per-call latency of a fresh API client versus the shared client registry.
+
+Starts a local OpenAI-compatible stub server and sends the same chat
+completion request through:
+
+  fresh  - a new OpenAI client per call, as perplexity_search used to do
+           (new connection pool, new TCP connection every time)
+  shared - app.ai.clients.openai_client, whose pooled connection is kept
+           alive across calls
+
+--connect-delay makes the stub wait before serving each new connection, to
+stand in for the TCP and TLS handshakes of a remote API (50 ms is a modest
+round trip plus handshake; 0 measures loopback only).
+
+Run from the repository root:
+
+    python -m benchmarks.bench_clients [--calls 200] [--connect-delay 0.05]
+"""
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import OpenAI
+
+from app.ai import clients
+
+COMPLETION = json.dumps({
+    'id': 'stub', 'object': 'chat.completion', 'created': 0, 'model': 'stub',
+    'choices': [{'index': 0, 'finish_reason': 'stop',
+                 'message': {'role': 'assistant', 'content': 'pong'}}],
+    'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    connect_delay = 0.0
+    connections = 0
+
+    def setup(self):
+        type(self).connections += 1
+        time.sleep(self.connect_delay)
+        super().setup()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def complete(client):
+    response = client.chat.completions.create(
+        model='stub', messages=[{'role': 'user', 'content': 'ping'}])
+    return response.choices[0].message.content
+
+
+def time_calls(calls, get_client):
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        complete(get_client())
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(label, latencies, connections):
+    latencies = sorted(latencies)
+    print(f"{label:>7}: mean {statistics.mean(latencies):7.2f} ms  "
+          f"p50 {latencies[len(latencies) // 2]:7.2f} ms  "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1]:7.2f} ms  "
+          f"connections {connections}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--connect-delay', type=float, default=0.05)
+    args = parser.parse_args()
+
+    StubHandler.connect_delay = args.connect_delay
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault('PERPLEXITY_API_KEY', 'stub')
+
+    print(f"{args.calls} calls, {args.connect_delay * 1000:.0f} ms per new connection")
+
+    StubHandler.connections = 0
+    fresh = time_calls(args.calls, lambda: OpenAI(api_key='stub', base_url=base_url))
+    report('fresh', fresh, StubHandler.connections)
+
+    StubHandler.connections = 0
+    shared = time_calls(args.calls, lambda: clients.openai_client('perplexity', base_url))
+    report('shared', shared, StubHandler.connections)
+
+    print(f"saved per call: {statistics.mean(fresh) - statistics.mean(shared):.2f} ms")
+    clients.close_clients()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Compare ops/sec of the chat and task database paths.
+
+"before" replays the original connect-per-call implementation (default
+rollback journal, a fresh connection for every statement); "after" uses the
+functions in app.db with their shared per-thread WAL connection.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_db [--ops 2000]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from app import db
+
+
+# The pre-WAL implementation, kept here only as a baseline.
+
+def legacy_store_message(path, channel_id, role, content):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute('''
+        INSERT INTO messages (channel_id, role, content)
+        VALUES (?, ?, ?)
+    ''', (channel_id, role, content))
+    conn.commit()
+    conn.close()
+
+
+def legacy_get_message_history(path, channel_id):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute('''
+        SELECT role, content FROM messages
+        WHERE channel_id = ?
+        ORDER BY id ASC
+    ''', (channel_id,))
+    messages = [{'role': row[0], 'content': row[1]} for row in c.fetchall()]
+    conn.close()
+    return messages
+
+
+def legacy_create_task(path, title):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute('''
+        INSERT INTO tasks (title, description, completed, dueDate, parentID)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (title, '', 0, None, None))
+    conn.commit()
+    task_id = c.lastrowid
+    conn.close()
+    return task_id
+
+
+def legacy_get_task(path, task_id):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    row = conn.execute('SELECT * FROM tasks WHERE id = ?',
+                       (task_id,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def legacy_update_task(path, task_id, title):
+    conn = sqlite3.connect(path)
+    task = legacy_get_task(path, task_id)
+    conn.execute('''
+        UPDATE tasks
+        SET title = ?, description = ?, completed = ?, dueDate = ?, parentID = ?
+        WHERE id = ?
+    ''', (title, task['description'], task['completed'], None, task['parentID'], task_id))
+    conn.commit()
+    conn.close()
+
+
+def legacy_workloads(path):
+    def message_path(i):
+        channel = f'bench-{i % 50}'
+        legacy_store_message(path, channel, 'human', f'message {i}')
+        legacy_get_message_history(path, channel)
+
+    def task_path(i):
+        task_id = legacy_create_task(path, f'task {i}')
+        legacy_get_task(path, task_id)
+        legacy_update_task(path, task_id, f'task {i} (edited)')
+
+    return message_path, task_path
+
+
+def current_workloads():
+    def message_path(i):
+        channel = f'bench-{i % 50}'
+        db.store_message(channel, 'human', f'message {i}')
+        db.get_message_history(channel)
+
+    def task_path(i):
+        task_id = db.create_task(f'task {i}')['id']
+        db.get_task(task_id)
+        db.update_task(task_id, title=f'task {i} (edited)')
+
+    return message_path, task_path
+
+
+def measure(fn, ops):
+    start = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    return ops / (time.perf_counter() - start)
+
+
+def fresh_database(directory, name):
+    db.close_db_connections()
+    db.DATABASE = os.path.join(directory, name)
+    db.init_db()
+    return db.DATABASE
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ops', type=int, default=2000,
+                        help='operations per workload')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        before_path = fresh_database(directory, 'before.db')
+        # init_db switched the file to WAL; the baseline used the default
+        # rollback journal.
+        db.close_db_connections()
+        conn = sqlite3.connect(before_path)
+        conn.execute('PRAGMA journal_mode = DELETE')
+        conn.close()
+        before = [measure(fn, args.ops) for fn in legacy_workloads(before_path)]
+
+        fresh_database(directory, 'after.db')
+        after = [measure(fn, args.ops) for fn in current_workloads()]
+        db.close_db_connections()
+
+    print(f"{'workload':<10}{'before ops/s':>15}{'after ops/s':>15}{'speedup':>10}")
+    for name, b, a in zip(('messages', 'tasks'), before, after):
+        print(f"{name:<10}{b:>15,.0f}{a:>15,.0f}{a / b:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Compare function-call extraction on large model responses.
+
+* legacy  - the original extract_function_calls: compiles both regexes and
+            runs a unicode_escape decode on every call, after the whole
+            response has arrived.
+* regex   - the current extract_function_calls (precompiled patterns).
+* stream  - FunctionCallParser fed the response in small chunks the way a
+            streamed reply arrives.
+
+Besides CPU time, the report shows the streaming parser's cost per chunk
+(to compare with the model's inter-token latency, typically 10ms or more)
+and how far into the response the first call is known: the regex paths
+need all of it, the streaming parser only needs the text up to the call's
+closing parenthesis. Before timing, it checks that the parser only
+streams respond() text of calls that count, never a draft call written
+before the first code block.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_function_parser [--sizes 2000 20000 200000]
+"""
+import argparse
+import random
+import re
+import time
+
+from tools.file_operations import FunctionCallParser, extract_function_calls
+
+WORDS = ('the', 'archive', 'raven', 'remembers', 'user', 'asked', 'about',
+         'color', 'of', 'sky', 'and', 'answered', 'with', 'care', 'thoughts:')
+
+
+def legacy_extract_function_calls(ai_response):
+    code_block_pattern = r"```(?:\w+)?\s*(.*?)```"
+    code_blocks = re.findall(code_block_pattern, ai_response, re.DOTALL)
+    if not code_blocks:
+        code_blocks = [ai_response]
+    function_calls = []
+    function_pattern = r"""
+        (\w+)
+        \s*\(
+        \s*(['"])
+        (
+            (?:\\.|[^\\\2])*
+        )
+        \2\s*
+        \)
+    """
+    regex = re.compile(function_pattern, re.VERBOSE | re.DOTALL)
+    for block in code_blocks:
+        for match in regex.finditer(block):
+            function_name = match.group(1)
+            argument = match.group(3)
+            try:
+                argument = bytes(argument, "utf-8").decode("unicode_escape")
+            except UnicodeDecodeError:
+                continue
+            function_calls.append((function_name, argument))
+    return function_calls
+
+
+def make_response(size):
+    """Thoughts, one fenced call, then trailing prose, roughly `size` chars."""
+    rng = random.Random(size)
+
+    def prose(n):
+        out, length = [], 0
+        while length < n:
+            word = rng.choice(WORDS)
+            out.append(word)
+            length += len(word) + 1
+        return ' '.join(out)
+
+    call = '```python\nsearchdata("the user\'s favorite color")\n```'
+    return f"{prose(size // 4)}\n\n{call}\n\n{prose(size - size // 4)}"
+
+
+def chunks(text, size=4):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+# (response, respond() text the user should see streamed)
+RESPOND_CASES = [
+    ('thoughts: respond("draft")\n```python\nrespond("final \\"answer\\"")\n```',
+     'final "answer"'),
+    ('respond("no code block")', 'no code block'),
+]
+
+
+def check_respond_streaming():
+    for text, expected in RESPOND_CASES:
+        for size in (1, 3, 7, len(text)):
+            streamed = []
+            p = FunctionCallParser(
+                on_string=lambda name, string: name == 'respond' and streamed.append(string))
+            for piece in chunks(text, size):
+                p.feed(piece)
+            p.close()
+            assert ''.join(streamed) == expected, (text, size, streamed)
+
+
+def time_it(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def first_call_offset(pieces):
+    parser = FunctionCallParser()
+    consumed = 0
+    for piece in pieces:
+        consumed += len(piece)
+        if parser.feed(piece):
+            return consumed
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[2_000, 20_000, 200_000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    check_respond_streaming()
+
+    print(f"{'chars':>9}{'legacy ms':>12}{'regex ms':>11}{'stream ms':>12}"
+          f"{'us/chunk':>10}{'first call at':>16}")
+    for size in args.sizes:
+        text = make_response(size)
+        pieces = chunks(text)
+
+        def stream():
+            p = FunctionCallParser()
+            calls = []
+            for piece in pieces:
+                calls.extend(p.feed(piece))
+            return calls + p.close()
+
+        legacy_ms, expected = time_it(
+            lambda: legacy_extract_function_calls(text), args.repeat)
+        regex_ms, regex_calls = time_it(
+            lambda: extract_function_calls(text), args.repeat)
+        stream_ms, stream_calls = time_it(stream, args.repeat)
+        assert expected == regex_calls == stream_calls, (expected, stream_calls)
+
+        offset = first_call_offset(pieces)
+        print(f"{len(text):>9,}{legacy_ms:>12.3f}{regex_ms:>11.3f}{stream_ms:>12.3f}"
+              f"{stream_ms * 1000 / len(pieces):>10.2f}{offset / len(text):>15.0%}")
+
+
+if __name__ == '__main__':
+    main()
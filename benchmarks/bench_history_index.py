@@ -0,0 +1,118 @@
+"""Show the effect of the messages/tasks index migrations on lookups.
+
+Seeds a database in the original (unindexed) schema with a large number of
+messages spread across many channels, times the get_message_history query,
+applies app.migrations and times it again. The query plan is printed for
+both runs so the switch from a full table scan to an index range scan is
+visible.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_history_index [--messages 1000000] [--channels 1000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from app.migrations import migrate
+
+HISTORY_SQL = '''
+    SELECT role, content FROM messages
+    WHERE channel_id = ?
+    ORDER BY id ASC
+'''
+SUBTASKS_SQL = 'SELECT * FROM tasks WHERE parentID = ? ORDER BY id ASC'
+
+
+def create_legacy_schema(conn):
+    conn.execute('''
+        CREATE TABLE messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            completed BOOLEAN NOT NULL DEFAULT 0,
+            dueDate TEXT,
+            parentID INTEGER,
+            FOREIGN KEY(parentID) REFERENCES tasks(id) ON DELETE CASCADE
+        )
+    ''')
+
+
+def seed(conn, messages, channels, tasks):
+    roles = ('human', 'ai')
+    conn.executemany(
+        'INSERT INTO messages (channel_id, role, content) VALUES (?, ?, ?)',
+        ((f'channel-{random.randrange(channels)}', roles[i % 2], f'message {i}')
+         for i in range(messages)))
+    conn.executemany(
+        'INSERT INTO tasks (title, parentID) VALUES (?, ?)',
+        ((f'task {i}', random.randrange(1, i) if i > 1 else None)
+         for i in range(1, tasks + 1)))
+    conn.commit()
+
+
+def plan(conn, sql, param):
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', (param,)).fetchall()
+    return '; '.join(row[-1] for row in rows)
+
+
+def time_lookups(conn, sql, params):
+    start = time.perf_counter()
+    for param in params:
+        conn.execute(sql, (param,)).fetchall()
+    return (time.perf_counter() - start) / len(params) * 1000
+
+
+def report(conn, label, channel_params, task_params):
+    print(f"== {label}")
+    print(f"  history plan : {plan(conn, HISTORY_SQL, channel_params[0])}")
+    print(f"  history      : {time_lookups(conn, HISTORY_SQL, channel_params):.3f} ms/query")
+    print(f"  subtasks plan: {plan(conn, SUBTASKS_SQL, task_params[0])}")
+    print(f"  subtasks     : {time_lookups(conn, SUBTASKS_SQL, task_params):.3f} ms/query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=1_000_000)
+    parser.add_argument('--channels', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=100_000)
+    parser.add_argument('--lookups', type=int, default=50)
+    args = parser.parse_args()
+
+    random.seed(0)
+    channel_params = [f'channel-{random.randrange(args.channels)}'
+                      for _ in range(args.lookups)]
+    task_params = [random.randrange(1, args.tasks)
+                   for _ in range(args.lookups)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        conn = sqlite3.connect(os.path.join(directory, 'bench.db'))
+        create_legacy_schema(conn)
+        start = time.perf_counter()
+        seed(conn, args.messages, args.channels, args.tasks)
+        print(f"Seeded {args.messages:,} messages / {args.tasks:,} tasks "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        report(conn, 'before migrations', channel_params, task_params)
+
+        start = time.perf_counter()
+        version = migrate(conn)
+        print(f"Migrated to version {version} in {time.perf_counter() - start:.1f}s")
+
+        report(conn, 'after migrations', channel_params, task_params)
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Track server startup cost: import time breakdown and time to first HTTP 200.
+
+1. Runs `python -X importtime` on create_app() and prints the total
+   import time and the packages (summed over all their modules) that
+   account for most of it.
+2. Starts the server in a fresh process and polls / until it answers 200,
+   reporting the wall-clock time from process start.
+
+Both run in a temporary working directory, so the databases and logs the
+app creates on startup do not touch the checkout.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup [--runs 5] [--top 15]
+"""
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CREATE_APP = "from app import create_app; app = create_app()"
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| \s*(\S+)")
+
+
+def app_env():
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, RAVEN_WARM_UP='0')
+    env.setdefault('OPENAI_API_KEY', 'benchmark')
+    return env
+
+
+def import_breakdown(directory, top):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CREATE_APP],
+                            cwd=directory, env=app_env(), capture_output=True, text=True, check=True)
+    packages = defaultdict(int)
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            packages[match.group(3).split('.')[0]] += int(match.group(1))
+    total = sum(packages.values())
+    print(f"Imports for create_app(): {total / 1e6:.2f}s total")
+    for name, self_time in sorted(packages.items(), key=lambda entry: -entry[1])[:top]:
+        print(f"  {self_time / 1e6:7.3f}s  {name}")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_200(directory, timeout=120):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-c', f"{CREATE_APP}; app.run(port={port})"],
+        cwd=directory, env=app_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with code {server.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=5) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.02)
+        raise RuntimeError("Server did not answer in time")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        import_breakdown(directory, args.top)
+        timings = [time_to_first_200(directory) for _ in range(args.runs)]
+    print(f"Time to first HTTP 200 over {args.runs} runs: "
+          f"min {min(timings):.2f}s  median {statistics.median(timings):.2f}s  "
+          f"max {max(timings):.2f}s")
+
+
+if __name__ == '__main__':
+    main()
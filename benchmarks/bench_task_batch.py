@@ -0,0 +1,127 @@
+"""Compare task mutation throughput: one event per change vs tasks_batch.
+
+The workload creates --ops tasks, updates each one and then deletes each one.
+"per event" applies every change on its own (create_task, update_task,
+delete_task: one commit and one reply each); "batched" sends the same
+changes in groups of --batch through apply_task_batch / tasks_batch (one
+commit and one reply per group). Both are measured at the database layer
+and through the socket handlers, using Flask-SocketIO's in-process test
+client so that every reply's delta query and emit is included.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_task_batch [--ops 2000] [--batch 20]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+
+from app import create_app, db, socketio  # noqa: E402
+
+
+def chunks(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def db_per_event(ops, batch):
+    ids = [db.create_task(f'task {i}')['id'] for i in range(ops)]
+    for task_id in ids:
+        db.update_task(task_id, title=f'task {task_id} (edited)')
+    for task_id in ids:
+        db.delete_task_tree(task_id)
+
+
+def db_batched(ops, batch):
+    ids = []
+    for group in chunks(range(ops), batch):
+        results = db.apply_task_batch([{'op': 'create', 'title': f'task {i}'} for i in group])
+        ids.extend(result['id'] for result in results)
+    for group in chunks(ids, batch):
+        db.apply_task_batch([{'op': 'update', 'id': task_id, 'title': f'task {task_id} (edited)'}
+                             for task_id in group])
+    for group in chunks(ids, batch):
+        db.apply_task_batch([{'op': 'delete', 'id': task_id} for task_id in group])
+
+
+class SocketClient:
+    """Test client that tracks the task version like tasks.js does."""
+
+    def __init__(self, app):
+        self.client = socketio.test_client(app)
+        self.version = None
+        self.emit('tasks_sync', {})
+
+    def emit(self, event, data):
+        self.client.emit(event, {**data, 'version': self.version})
+        replies = [reply['args'][0] for reply in self.client.get_received()
+                   if reply['name'] == 'tasks_delta']
+        if not replies:
+            raise RuntimeError(f"{event} got no tasks_delta reply")
+        self.version = replies[-1]['version']
+        return replies[-1]
+
+
+def socket_per_event(client, ops, batch):
+    ids = []
+    for i in range(ops):
+        delta = client.emit('create_task', {'title': f'task {i}'})
+        ids.append(max(task['id'] for task in delta['tasks']))
+    for task_id in ids:
+        client.emit('update_task', {'id': task_id, 'title': f'task {task_id} (edited)'})
+    for task_id in ids:
+        client.emit('delete_task', {'id': task_id})
+
+
+def socket_batched(client, ops, batch):
+    ids = []
+    for group in chunks(range(ops), batch):
+        delta = client.emit('tasks_batch', {'ops': [{'op': 'create', 'title': f'task {i}'}
+                                                    for i in group]})
+        ids.extend(result['id'] for result in delta['results'])
+    for group in chunks(ids, batch):
+        client.emit('tasks_batch', {'ops': [{'op': 'update', 'id': task_id,
+                                             'title': f'task {task_id} (edited)'}
+                                            for task_id in group]})
+    for group in chunks(ids, batch):
+        client.emit('tasks_batch', {'ops': [{'op': 'delete', 'id': task_id} for task_id in group]})
+
+
+def measure(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ops', type=int, default=2000,
+                        help='tasks created, updated and deleted per run')
+    parser.add_argument('--batch', type=int, default=20,
+                        help='operations per batch')
+    args = parser.parse_args()
+    changes = args.ops * 3
+
+    with tempfile.TemporaryDirectory() as directory:
+        db.DATABASE = os.path.join(directory, 'tasks.db')
+        app = create_app()
+        client = SocketClient(app)
+        rows = [
+            ('db', measure(db_per_event, args.ops, args.batch),
+             measure(db_batched, args.ops, args.batch)),
+            ('socket', measure(socket_per_event, client, args.ops, args.batch),
+             measure(socket_batched, client, args.ops, args.batch)),
+        ]
+        db.close_db_connections()
+
+    print(f"{changes} changes, batches of {args.batch}")
+    print(f"{'path':<8}{'per event/s':>14}{'batched/s':>14}{'speedup':>10}")
+    for name, per_event, batched in rows:
+        print(f"{name:<8}{changes / per_event:>14,.0f}{changes / batched:>14,.0f}"
+              f"{per_event / batched:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Compare the NumPy vector backend with Chroma at several store sizes.
+
+For every backend and size a store is filled with random unit vectors in a
+temporary directory. Each store is then reopened in a fresh process, which
+reports the cold start (open plus first query), the steady-state query
+latency and the resident memory of that process.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_vectorstore [--sizes 10000 100000 1000000] [--dim 1536]
+
+Chroma is slow to fill at the largest sizes; --chroma-max (default 100000)
+skips it above that many vectors.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.ai.numpy_store import NumpyVectorStore
+
+FILL_BATCH = 5000
+
+
+class RandomEmbeddings(Embeddings):
+    """Stand-in model; the benchmark only searches by vector."""
+
+    def __init__(self, dim):
+        self.dim = dim
+        self.rng = np.random.default_rng(0)
+
+    def embed_documents(self, texts):
+        return self.rng.standard_normal((len(texts), self.dim)).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def random_vectors(rng, count, dim):
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def open_store(backend, directory, dim):
+    if backend == 'numpy':
+        return NumpyVectorStore(directory, RandomEmbeddings(dim))
+    from langchain_chroma import Chroma
+    return Chroma(persist_directory=directory, embedding_function=RandomEmbeddings(dim))
+
+
+def fill(backend, directory, size, dim):
+    store = open_store(backend, directory, dim)
+    rng = np.random.default_rng(1)
+    for start in range(0, size, FILL_BATCH):
+        count = min(FILL_BATCH, size - start)
+        vectors = random_vectors(rng, count, dim)
+        ids = [str(i) for i in range(start, start + count)]
+        texts = [f'document {i}' for i in range(start, start + count)]
+        metadatas = [{'id': doc_id} for doc_id in ids]
+        if backend == 'numpy':
+            store.add_vectors(vectors, texts, metadatas, ids)
+        else:
+            store._collection.add(ids=ids, embeddings=vectors.tolist(),
+                                  documents=texts, metadatas=metadatas)
+
+
+def resident_memory_mb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+def measure(backend, directory, dim, queries, k):
+    """Runs in the child process; prints one JSON line of results."""
+    rng = np.random.default_rng(2)
+    query_vectors = random_vectors(rng, queries + 1, dim).tolist()
+
+    start = time.perf_counter()
+    store = open_store(backend, directory, dim)
+    store.similarity_search_by_vector(query_vectors[0], k)
+    cold_start = time.perf_counter() - start
+
+    latencies = []
+    for vector in query_vectors[1:]:
+        start = time.perf_counter()
+        store.similarity_search_by_vector(vector, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    print(json.dumps({
+        'cold_start_s': cold_start,
+        'mean_ms': statistics.mean(latencies),
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1],
+        'rss_mb': resident_memory_mb(),
+    }))
+
+
+def run(backend, size, args):
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        fill(backend, directory, size, args.dim)
+        fill_time = time.perf_counter() - start
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_vectorstore', '--measure', backend,
+             directory, '--dim', str(args.dim), '--queries', str(args.queries), '--k', str(args.k)],
+            check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+    print(f"{backend:>6} {size:>10,} {fill_time:>9.1f}s {result['cold_start_s']:>9.2f}s "
+          f"{result['mean_ms']:>9.2f}ms {result['p95_ms']:>9.2f}ms {result['rss_mb']:>9.0f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--backends', nargs='+', default=['numpy', 'chroma'])
+    parser.add_argument('--chroma-max', type=int, default=100_000)
+    parser.add_argument('--measure', nargs=2, metavar=('BACKEND', 'DIRECTORY'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(*args.measure, args.dim, args.queries, args.k)
+        return
+
+    print(f"dim={args.dim} k={args.k} queries={args.queries}")
+    print(f"{'store':>6} {'vectors':>10} {'fill':>10} {'cold':>10} "
+          f"{'mean':>11} {'p95':>11} {'rss':>11}")
+    for size in args.sizes:
+        for backend in args.backends:
+            if backend == 'chroma' and size > args.chroma_max:
+                print(f"{backend:>6} {size:>10,}  skipped (--chroma-max {args.chroma_max:,})")
+                continue
+            run(backend, size, args)
+
+
+if __name__ == '__main__':
+    main()
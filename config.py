@@ -0,0 +1,84 @@
+# config.py
+import os
+
+# Conversation context sent to general_chat_raven: the newest messages that fit
+# in the token budget go verbatim, everything older is folded into a summary.
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv('RAVEN_CHAT_CONTEXT_TOKENS', '6000'))
+CHAT_SUMMARY_MAX_WORDS = int(os.getenv('RAVEN_CHAT_SUMMARY_WORDS', '300'))
+
+# Stream model output to the browser as it is generated instead of waiting
+# for the complete answer.
+STREAM_RESPONSES = os.getenv('RAVEN_STREAM_RESPONSES', '1') == '1'
+
+# Threads available for running tool calls (searchdata, onlinesearch, ...)
+# alongside the chat model.
+TOOL_WORKERS = int(os.getenv('RAVEN_TOOL_WORKERS', '4'))
+
+# Background workers that run model/tool pipelines for socket handlers, and
+# how many requests may wait for a free worker before new ones are rejected.
+JOB_WORKERS = int(os.getenv('RAVEN_JOB_WORKERS', '4'))
+JOB_QUEUE_SIZE = int(os.getenv('RAVEN_JOB_QUEUE_SIZE', '32'))
+
+# Embedding cache: an in-memory LRU of this many vectors in front of a SQLite
+# file, so repeated memory queries skip the embeddings API.
+EMBEDDING_CACHE_PATH = os.getenv('RAVEN_EMBEDDING_CACHE', 'embedding_cache.db')
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv('RAVEN_EMBEDDING_CACHE_ITEMS', '2048'))
+
+# Bulk memory ingestion: chunking of long texts, texts per embedding request,
+# and how many embedding requests may run at once.
+INGEST_CHUNK_SIZE = int(os.getenv('RAVEN_INGEST_CHUNK_SIZE', '1000'))
+INGEST_CHUNK_OVERLAP = int(os.getenv('RAVEN_INGEST_CHUNK_OVERLAP', '100'))
+INGEST_BATCH_SIZE = int(os.getenv('RAVEN_INGEST_BATCH_SIZE', '128'))
+INGEST_CONCURRENCY = int(os.getenv('RAVEN_INGEST_CONCURRENCY', '4'))
+
+# Memory search results kept until the next write to the vector store.
+MEMORY_SEARCH_CACHE_SIZE = int(os.getenv('RAVEN_MEMORY_SEARCH_CACHE', '256'))
+
+# Vector store behind Raven's memory: 'chroma', or 'numpy' for the in-process
+# memory-mapped matrix in app/ai/numpy_store.py.
+VECTOR_BACKEND = os.getenv('RAVEN_VECTOR_BACKEND', 'chroma')
+NUMPY_STORE_DIRECTORY = os.getenv('RAVEN_NUMPY_STORE', 'numpy_store')
+
+# Tools whose outcome is confirmed from a local template in Raven's voice
+# (prompts/confirm_*.md) instead of a second model call. Comma-separated;
+# supported: savedata, deletedata.
+FAST_CONFIRMATIONS = {name.strip() for name in
+                      os.getenv('RAVEN_FAST_CONFIRMATIONS', '').split(',') if name.strip()}
+
+# Memory prefetch for chat. 'parallel' searches memory for the latest user
+# message while the model runs and reuses the hits when the model calls
+# searchdata with a query at least this similar (cosine of the embeddings).
+# 'inject' also waits for those hits and puts them in the system prompt.
+MEMORY_PREFETCH = os.getenv('RAVEN_MEMORY_PREFETCH', 'off')
+MEMORY_PREFETCH_SIMILARITY = float(os.getenv('RAVEN_MEMORY_PREFETCH_SIMILARITY', '0.9'))
+
+# HTTP connection pool shared by all clients of one model provider
+# (app/ai/clients.py): size, idle keep-alive and timeouts in seconds.
+HTTP_MAX_CONNECTIONS = int(os.getenv('RAVEN_HTTP_MAX_CONNECTIONS', '20'))
+HTTP_MAX_KEEPALIVE = int(os.getenv('RAVEN_HTTP_MAX_KEEPALIVE', '10'))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('RAVEN_HTTP_KEEPALIVE_EXPIRY', '60'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('RAVEN_HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('RAVEN_HTTP_READ_TIMEOUT', '120'))
+
+# Online search answers, cached by normalized query for this many seconds and
+# up to this many entries (least recently used are evicted first).
+ONLINE_SEARCH_CACHE_PATH = os.getenv('RAVEN_ONLINE_SEARCH_CACHE', 'search_cache.db')
+ONLINE_SEARCH_CACHE_TTL = float(os.getenv('RAVEN_ONLINE_SEARCH_TTL', '21600'))
+ONLINE_SEARCH_CACHE_SIZE = int(os.getenv('RAVEN_ONLINE_SEARCH_CACHE_SIZE', '1000'))
+
+# Log the duration of every timed operation (model, embedding, vector store,
+# tool and SQLite calls) tagged with the request's trace id.
+LOG_SPANS = os.getenv('RAVEN_LOG_SPANS', '0') == '1'
+
+# Logging: messages longer than this are cut in logs/raven.log and on the
+# console. With RAVEN_LOG_PAYLOADS=1 the full text of that share of them is
+# written to logs/payloads.log.
+LOG_MAX_MESSAGE_CHARS = int(os.getenv('RAVEN_LOG_MAX_CHARS', '2000'))
+LOG_PAYLOADS = os.getenv('RAVEN_LOG_PAYLOADS', '0') == '1'
+LOG_PAYLOAD_SAMPLE = float(os.getenv('RAVEN_LOG_PAYLOAD_SAMPLE', '1.0'))
+
+# Port of the web interface, and whether to create the models and vector
+# store in the background as soon as the server is listening (otherwise
+# they are created by the first request that needs them).
+SERVER_PORT = int(os.getenv('RAVEN_PORT', '5000'))
+WARM_UP = os.getenv('RAVEN_WARM_UP', '1') == '1'
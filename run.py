@@ -1,4 +1,4 @@
 from tray import tray_app
 
 if __name__ == "__main__":
-    tray_app  # This will start the tray application and the Flask app
+    tray_app.main()  # Starts the tray application and the Flask app
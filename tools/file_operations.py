@@ -1,18 +1,42 @@
-import os
 import re
 
+from tools.prompt_registry import prompts
+
 
 def read_prompt_from_file(filename):
-    script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    file_path = os.path.join(script_dir, 'prompts', filename)
-    with open(file_path, 'r') as file:
-        return file.read().strip()
+    return prompts.get(filename)
 
 
 def clean_string(arg):
     return arg.strip().strip('"').strip("'")
 
 
+# Regular expression to match code blocks (e.g., ```sql ... ```)
+CODE_BLOCK_PATTERN = re.compile(r"```(?:\w+)?\s*(.*?)```", re.DOTALL)
+
+# Regular expression to capture function calls with one string argument, handling escaped quotes
+FUNCTION_PATTERN = re.compile(r"""
+    (\w+)                       # Function name: one or more word characters
+    \s*\(                       # Opening parenthesis with optional whitespace
+    \s*(['"])                   # Capture the opening quote (single or double)
+    (                           # Start of argument capture group
+        (?:\\.|[^\\\2])*        # Match escaped chars or non-quote/non-backslash characters
+    )
+    \2\s*                       # Match the corresponding closing quote
+    \)                          # Closing parenthesis
+""", re.VERBOSE | re.DOTALL)
+
+
+def decode_argument(argument):
+    """Decode escaped characters within an argument string, or None if invalid."""
+    if '\\' not in argument:
+        return argument
+    try:
+        return bytes(argument, "utf-8").decode("unicode_escape")
+    except UnicodeDecodeError:
+        return None
+
+
 def extract_function_calls(ai_response):
     """
     Extracts all function names and their single string arguments from a multi-line string,
@@ -25,9 +49,7 @@ def extract_function_calls(ai_response):
         list: A list of tuples, each containing the function name and its argument string.
               Returns an empty list if no function calls are found.
     """
-    # Regular expression to match code blocks (e.g., ```sql ... ```)
-    code_block_pattern = r"```(?:\w+)?\s*(.*?)```"
-    code_blocks = re.findall(code_block_pattern, ai_response, re.DOTALL)
+    code_blocks = CODE_BLOCK_PATTERN.findall(ai_response)
 
     # If no code blocks are found, consider the entire text
     if not code_blocks:
@@ -35,32 +57,211 @@ def extract_function_calls(ai_response):
 
     function_calls = []
 
-    # Regular expression to capture function calls with one string argument, handling escaped quotes
-    function_pattern = r"""
-        (\w+)                       # Function name: one or more word characters
-        \s*\(                       # Opening parenthesis with optional whitespace
-        \s*(['"])                   # Capture the opening quote (single or double)
-        (                           # Start of argument capture group
-            (?:\\.|[^\\\2])*        # Match escaped chars or non-quote/non-backslash characters
-        )
-        \2\s*                       # Match the corresponding closing quote
-        \)                          # Closing parenthesis
-    """
-
-    regex = re.compile(function_pattern, re.VERBOSE | re.DOTALL)
-
     for block in code_blocks:
-        for match in regex.finditer(block):
+        for match in FUNCTION_PATTERN.finditer(block):
             function_name = match.group(1)
-            argument = match.group(3)
-
-            # Decode escaped characters within the argument string
-            try:
-                argument = bytes(argument, "utf-8").decode("unicode_escape")
-            except UnicodeDecodeError:
-                # If decoding fails, skip this match
+            # If decoding fails, skip this match
+            argument = decode_argument(match.group(3))
+            if argument is None:
                 continue
 
             function_calls.append((function_name, argument))
 
     return function_calls
+
+
+class FunctionCallParser:
+    """
+    Incremental counterpart of extract_function_calls for streamed responses.
+
+    Text is fed in arbitrary chunks; each `name("arg")` call is returned from
+    feed() as soon as its closing parenthesis arrives. As with
+    extract_function_calls, once a code block has been seen only calls inside
+    code blocks count, so calls outside fences are held back and only
+    returned by close() when the response contained no code block at all.
+
+    An unescaped closing quote that is not followed by `)` is treated as part
+    of the argument, so `query('... WHERE title = 'x'')` parses like the
+    regex does.
+
+    `on_string(name, text)`, if given, receives the decoded text of each
+    string argument of a call that counts: inside a code block as it streams
+    in, before its call is complete, and for calls outside code blocks all at
+    once from close().
+    """
+
+    TEXT, ARGS, STRING, AFTER_QUOTE = range(4)
+
+    # Only these characters can change state; everything in between is
+    # skipped with a single regex search instead of a Python-level loop.
+    TEXT_STOP = re.compile(r"[`(]")
+    FENCE_STOP = re.compile(r"`")
+    STRING_STOP = re.compile(r"[\\'\"]")
+    TRAILING_WORD = re.compile(r"(\w*)(\s*)\Z")
+    ESCAPES = {'n': '\n', 't': '\t', 'r': '\r'}
+
+    def __init__(self, on_string=None):
+        self.on_string = on_string
+        self.state = self.TEXT
+        self.in_fence = False
+        self.seen_fence = False
+        self.backticks = 0
+        self.word = ''
+        self.word_ended = False
+        self.name = ''
+        self.quote = ''
+        self.argument = []
+        self.escaped = False
+        self.pending = ''
+        self.loose_calls = []
+
+    def feed(self, chunk):
+        """Consume the next piece of text and return the calls it completed."""
+        calls = []
+        i, end = 0, len(chunk)
+        while i < end:
+            if self.state == self.TEXT:
+                i = self._skip_text(chunk, i)
+            elif self.state == self.STRING and not self.escaped:
+                i = self._skip_string(chunk, i)
+            if i < end and self._step(chunk[i], calls):
+                i += 1
+        return calls
+
+    def close(self):
+        """Finish the response and return any calls only known at the end."""
+        calls = [] if self.seen_fence else self.loose_calls
+        self.loose_calls = []
+        if self.on_string is not None:
+            for name, argument in calls:
+                self.on_string(name, argument)
+        return calls
+
+    def _skip_text(self, chunk, i):
+        if self.seen_fence and not self.in_fence:
+            # Calls between code blocks are ignored, only look for a fence.
+            match = self.FENCE_STOP.search(chunk, i)
+            stop = match.start() if match else len(chunk)
+            if stop > i:
+                self.backticks = 0
+                self.word = ''
+                self.word_ended = False
+            return stop
+
+        match = self.TEXT_STOP.search(chunk, i)
+        stop = match.start() if match else len(chunk)
+        if stop == i:
+            return i
+        # Carry over the identifier the skipped text ends with, if any
+        segment = chunk[i:stop]
+        self.backticks = 0
+        tail = self.TRAILING_WORD.search(segment)
+        word, spaces = tail.group(1), tail.group(2)
+        if word:
+            if tail.start() == 0 and not self.word_ended:
+                self.word += word
+            else:
+                self.word = word
+            self.word_ended = bool(spaces)
+        elif spaces and tail.start() == 0:
+            self.word_ended = bool(self.word)
+        else:
+            self.word = ''
+            self.word_ended = False
+        return stop
+
+    def _skip_string(self, chunk, i):
+        match = self.STRING_STOP.search(chunk, i)
+        stop = match.start() if match else len(chunk)
+        if stop > i:
+            self.argument.append(chunk[i:stop])
+            self._stream(chunk[i:stop])
+        return stop
+
+    def _stream(self, text):
+        # Calls outside code blocks may still be dropped by a later fence, so
+        # their strings wait for close().
+        if self.on_string is not None and self.in_fence:
+            self.on_string(self.name, text)
+
+    def _step(self, ch, calls):
+        # Returns False when `ch` has to be looked at again in the new state.
+        if self.state == self.STRING:
+            if self.escaped:
+                self.escaped = False
+                self._stream(self.ESCAPES.get(ch, ch))
+            elif ch == '\\':
+                self.escaped = True
+            elif ch == self.quote:
+                self.state = self.AFTER_QUOTE
+                self.pending = ''
+                return True
+            else:
+                self._stream(ch)
+            self.argument.append(ch)
+            return True
+
+        if self.state == self.AFTER_QUOTE:
+            if ch.isspace():
+                self.pending += ch
+            elif ch == ')':
+                self._finish_call(calls)
+            else:
+                self.argument.append(self.quote + self.pending)
+                self._stream(self.quote + self.pending)
+                self.state = self.STRING
+                return False
+            return True
+
+        if self.state == self.ARGS:
+            if ch.isspace():
+                return True
+            if ch in '\'"':
+                self.quote = ch
+                self.argument = []
+                self.escaped = False
+                self.state = self.STRING
+                return True
+            self.state = self.TEXT
+            self.word = ''
+            return False
+
+        # TEXT
+        if ch == '`':
+            self.backticks += 1
+            if self.backticks == 3:
+                self.backticks = 0
+                self.in_fence = not self.in_fence
+                if not self.seen_fence:
+                    self.seen_fence = True
+                    self.loose_calls = []
+            self.word = ''
+            return True
+        self.backticks = 0
+
+        if ch.isalnum() or ch == '_':
+            if self.word_ended:
+                self.word = ''
+                self.word_ended = False
+            self.word += ch
+        elif ch == '(' and self.word:
+            self.name = self.word
+            self.word = ''
+            self.word_ended = False
+            self.state = self.ARGS
+        elif ch.isspace() and self.word:
+            self.word_ended = True
+        else:
+            self.word = ''
+            self.word_ended = False
+        return True
+
+    def _finish_call(self, calls):
+        self.state = self.TEXT
+        argument = decode_argument(''.join(self.argument))
+        if argument is None:
+            return
+        if self.in_fence:
+            calls.append((self.name, argument))
+        elif not self.seen_fence:
+            self.loose_calls.append((self.name, argument))
@@ -1,13 +1,89 @@
+import atexit
+import copy
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from functools import wraps
 import os
 
+from config import LOG_MAX_MESSAGE_CHARS, LOG_PAYLOADS, LOG_PAYLOAD_SAMPLE
+from tools.tracing import TraceIdFilter
+
 # Create a logs directory if it doesn't exist
 log_directory = 'logs'
 if not os.path.exists(log_directory):
     os.makedirs(log_directory)
 
+
+def truncate(text, max_chars):
+    if max_chars is None or len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... [{len(text) - max_chars} more chars]"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with the message cut to `max_chars`."""
+
+    def __init__(self, max_chars=None):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'trace_id': getattr(record, 'trace_id', '-'),
+            'message': truncate(record.getMessage(), self.max_chars),
+        }
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TruncatingFormatter(logging.Formatter):
+    """Plain text format with the message cut to `max_chars`."""
+
+    def __init__(self, fmt, max_chars=None):
+        super().__init__(fmt)
+        self.max_chars = max_chars
+
+    def format(self, record):
+        record = copy.copy(record)
+        record.msg = truncate(record.getMessage(), self.max_chars)
+        record.args = None
+        return super().format(record)
+
+
+class PayloadFilter(logging.Filter):
+    """Passes a sample of the records whose message is too long for the main log."""
+
+    def filter(self, record):
+        return (len(record.getMessage()) > LOG_MAX_MESSAGE_CHARS
+                and random.random() < LOG_PAYLOAD_SAMPLE)
+
+
+class LogQueueHandler(QueueHandler):
+    """Hands records to the listener thread with as little work as possible.
+
+    Only the message and traceback are resolved here, so that the record no
+    longer depends on objects the caller may change; all formatting and I/O
+    happens on the listener thread.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
 # Configure the logger
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -21,13 +97,32 @@ file_handler = RotatingFileHandler(
 console_handler = logging.StreamHandler()
 
 # Create formatters and add it to handlers
-log_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(log_format)
-console_handler.setFormatter(log_format)
+file_handler.setFormatter(JsonFormatter(LOG_MAX_MESSAGE_CHARS))
+console_handler.setFormatter(TruncatingFormatter(
+    '%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s', LOG_MAX_MESSAGE_CHARS))
+handlers = [file_handler, console_handler]
+
+# Full prompts and responses, when enabled, go to their own file
+if LOG_PAYLOADS:
+    payload_handler = RotatingFileHandler(
+        os.path.join(log_directory, 'payloads.log'),
+        maxBytes=50*1024*1024,  # 50MB
+        backupCount=2
+    )
+    payload_handler.setFormatter(JsonFormatter())
+    payload_handler.addFilter(PayloadFilter())
+    handlers.append(payload_handler)
+
+# Callers only put records on a queue; a background thread writes them out
+log_queue = queue.SimpleQueue()
+queue_handler = LogQueueHandler(log_queue)
+# Tag every record with the current request's trace id
+queue_handler.addFilter(TraceIdFilter())
+logger.addHandler(queue_handler)
 
-# Add handlers to the logger
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)
 
 def log_ai_interaction(func):
     @wraps(func)
@@ -0,0 +1,188 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+from config import LOG_SPANS
+from tools.logging_utils import logger
+
+# Upper bounds, in seconds, shared by every latency histogram: sub-millisecond
+# SQLite calls up to model calls of a minute or more.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_registry = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def log_span(name, labels, elapsed):
+    if LOG_SPANS:
+        logger.info(f"span {name} {labels} {elapsed * 1000:.1f} ms")
+
+
+class Counter:
+    """Monotonic counter with labels, exported in Prometheus text format."""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {value:g}')
+        return lines
+
+
+class Histogram:
+    """Latency histogram with labels, exported in Prometheus text format."""
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block, and log it as a span if enabled."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(elapsed, **labels)
+            log_span(self.name, labels, elapsed)
+
+    def timed(self, label):
+        """Decorator timing every call, labelled `label`=<function name>."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**{label: func.__name__}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, [('le', f'{bound:g}')])
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = _format_labels(self.labelnames, key, [('le', '+Inf')])
+                lines.append(f'{self.name}_bucket{labels} {series[-1]}')
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f'{self.name}_sum{labels} {series[-2]:g}')
+                lines.append(f'{self.name}_count{labels} {series[-1]}')
+        return lines
+
+
+def render_metrics() -> str:
+    """Every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+MODEL_SECONDS = Histogram(
+    'raven_model_call_seconds', 'Chat model call duration.', ['model'])
+MODEL_TOKENS = Counter(
+    'raven_model_tokens_total', 'Tokens used by chat model calls.', ['model', 'kind'])
+EMBEDDING_SECONDS = Histogram(
+    'raven_embedding_seconds', 'Embedding API call duration.', ['operation'])
+EMBEDDING_TEXTS = Counter(
+    'raven_embedding_texts_total', 'Texts looked up in the embedding cache.', ['result'])
+VECTORSTORE_SECONDS = Histogram(
+    'raven_vectorstore_seconds', 'Vector store operation duration.', ['operation'])
+TOOL_SECONDS = Histogram(
+    'raven_tool_seconds', 'Tool (execute_command) duration.', ['tool'])
+TOOL_CALLS = Counter(
+    'raven_tool_calls_total', 'Tool invocations.', ['tool', 'status'])
+TOOL_MODEL_CALLS = Counter(
+    'raven_tool_model_calls_total', 'Chat model calls made by tools.', ['tool'])
+DB_SECONDS = Histogram(
+    'raven_db_seconds', 'SQLite function duration.', ['function'])
+
+# Model calls made while a tool runs are charged to that tool. The variable
+# holds a one-element list so the counting callback can update it in place.
+_current_tool_calls = contextvars.ContextVar('current_tool_calls', default=None)
+
+_tool_stats = defaultdict(lambda: {'invocations': 0, 'model_calls': 0})
+_lock = threading.Lock()
+
+
+@contextmanager
+def tool_invocation(name: str):
+    """Time the block and count its model calls against tool `name`."""
+    calls = [0]
+    token = _current_tool_calls.set(calls)
+    status = 'error'
+    try:
+        with TOOL_SECONDS.time(tool=name):
+            yield calls
+        status = 'ok'
+    finally:
+        _current_tool_calls.reset(token)
+        TOOL_CALLS.inc(tool=name, status=status)
+        TOOL_MODEL_CALLS.inc(calls[0], tool=name)
+        with _lock:
+            stats = _tool_stats[name]
+            stats['invocations'] += 1
+            stats['model_calls'] += calls[0]
+
+
+def count_model_call() -> None:
+    calls = _current_tool_calls.get()
+    if calls is not None:
+        calls[0] += 1
+
+
+def tool_stats() -> dict:
+    """Invocations, model calls and model calls per invocation for every tool."""
+    with _lock:
+        return {
+            name: {**stats, 'model_calls_per_invocation':
+                   stats['model_calls'] / stats['invocations'] if stats['invocations'] else 0.0}
+            for name, stats in _tool_stats.items()
+        }
@@ -0,0 +1,60 @@
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from tools.metrics import MODEL_SECONDS, MODEL_TOKENS, count_model_call, log_span
+
+# Lives apart from tools.metrics so that modules timing themselves with its
+# histograms, like the SQLite layer, do not have to load LangChain.
+
+
+def _token_usage(response):
+    """(prompt, completion) tokens of an LLMResult, streaming or not."""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+            if usage:
+                return usage.get('input_tokens', 0), usage.get('output_tokens', 0)
+    usage = (response.llm_output or {}).get('token_usage') or {}
+    return usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)
+
+
+class ModelCallCounter(BaseCallbackHandler):
+    """LangChain callback recording every chat model call.
+
+    Counts the call against the running tool, and records its duration and
+    token usage, whether the model is invoked directly or inside a chain.
+    """
+
+    def __init__(self):
+        self._started = {}  # run id -> (model name, start time)
+
+    def _start(self, serialized, run_id, kwargs):
+        count_model_call()
+        params = kwargs.get('invocation_params') or {}
+        model = params.get('model') or params.get('model_name') or 'unknown'
+        self._started[run_id] = (model, time.perf_counter())
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(serialized, run_id, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(serialized, run_id, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        model, start = started
+        elapsed = time.perf_counter() - start
+        MODEL_SECONDS.observe(elapsed, model=model)
+        log_span(MODEL_SECONDS.name, {'model': model}, elapsed)
+        prompt_tokens, completion_tokens = _token_usage(response)
+        MODEL_TOKENS.inc(prompt_tokens, model=model, kind='prompt')
+        MODEL_TOKENS.inc(completion_tokens, model=model, kind='completion')
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+
+
+model_call_counter = ModelCallCounter()
@@ -0,0 +1,105 @@
+import os
+import re
+import threading
+
+PROMPTS_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'prompts')
+
+# Placeholders look like {user_prompt} or {DATE}
+PLACEHOLDER_PATTERN = re.compile(r"\{(\w+)\}")
+
+
+class PromptTemplate:
+    """A prompt pre-split into literal text and placeholder names.
+
+    Rendering is a single pass over the segments, so substituted values are
+    never themselves searched for placeholders, unlike chained str.replace.
+    Placeholders without a value are left in place.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        parts = PLACEHOLDER_PATTERN.split(text)
+        self.literals = parts[0::2]
+        self.placeholders = parts[1::2]
+
+    def render(self, **values):
+        if not self.placeholders:
+            return self.text
+        out = [self.literals[0]]
+        for name, literal in zip(self.placeholders, self.literals[1:]):
+            value = values.get(name)
+            out.append('{' + name + '}' if value is None else str(value))
+            out.append(literal)
+        return ''.join(out)
+
+
+class PromptRegistry:
+    """Compiled templates for the files in the prompts directory.
+
+    The directory is read once on first use; afterwards a file is only read
+    again when its modification time changes, so prompts can still be edited
+    while the app is running. Concatenations such as the character prompt
+    followed by a task prompt are compiled once per combination.
+    """
+
+    def __init__(self, directory=PROMPTS_DIRECTORY):
+        self.directory = directory
+        self._files = {}     # filename -> (mtime, PromptTemplate)
+        self._combined = {}  # (filenames, separator) -> (parts, PromptTemplate)
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load_all(self):
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.md'):
+                self._load(filename)
+        self._loaded = True
+
+    def _load(self, filename):
+        path = os.path.join(self.directory, filename)
+        mtime = os.stat(path).st_mtime_ns
+        with open(path, 'r') as file:
+            entry = (mtime, PromptTemplate(file.read().strip()))
+        self._files[filename] = entry
+        return entry
+
+    def _template(self, filename):
+        with self._lock:
+            if not self._loaded:
+                self._load_all()
+            entry = self._files.get(filename)
+            mtime = os.stat(os.path.join(self.directory, filename)).st_mtime_ns
+            if entry is None or entry[0] != mtime:
+                entry = self._load(filename)
+            return entry[1]
+
+    def template(self, *filenames, separator="\n\n"):
+        """Return the template for one file, or for several joined by `separator`."""
+        if len(filenames) == 1:
+            return self._template(filenames[0])
+
+        parts = tuple(self._template(filename) for filename in filenames)
+        key = (filenames, separator)
+        cached = self._combined.get(key)
+        # Component templates are replaced on reload, so identity tells
+        # whether the combination is still current.
+        if cached is not None and all(a is b for a, b in zip(cached[0], parts)):
+            return cached[1]
+        combined = PromptTemplate(separator.join(part.text for part in parts))
+        self._combined[key] = (parts, combined)
+        return combined
+
+    def get(self, filename):
+        return self._template(filename).text
+
+    def render(self, *filenames, separator="\n\n", **values):
+        return self.template(*filenames, separator=separator).render(**values)
+
+
+prompts = PromptRegistry()
+
+
+def render_prompt(*filenames, **values):
+    """Render one or more prompt files (joined by a blank line) in a single pass."""
+    return prompts.render(*filenames, **values)
@@ -0,0 +1,40 @@
+import contextvars
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
+
+# Id of the socket request being handled, shown in every log line so the
+# spans of one request can be picked out of the log.
+trace_id = contextvars.ContextVar('trace_id', default='-')
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+@contextmanager
+def trace(value: Optional[str] = None):
+    """Run the block under trace id `value`, or a fresh one."""
+    token = trace_id.set(value or new_trace_id())
+    try:
+        yield trace_id.get()
+    finally:
+        trace_id.reset(token)
+
+
+class TraceIdFilter(logging.Filter):
+    """Adds the current trace id to log records as `trace_id`."""
+
+    def filter(self, record):
+        record.trace_id = trace_id.get()
+        return True
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """Thread pool whose tasks run in the submitter's context (trace id included)."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        context = contextvars.copy_context()
+        return super().submit(context.run, fn, *args, **kwargs)
@@ -1,25 +1,44 @@
+import socket
 import threading
+import time
 import webbrowser
-from flask import Flask
 from PIL import Image
 import pystray
 from pystray import MenuItem as item
 
 from app import create_app, socketio
+from config import SERVER_PORT, WARM_UP
 
 # Function to start Flask app
 
 
 def run_flask():
     app = create_app()
-    app.run(port=5000)
+    app.run(port=SERVER_PORT)
     socketio.run(app)
 
+# Function to warm up the AI clients once the server accepts connections
+
+
+def warm_up_when_listening(timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', SERVER_PORT), timeout=1):
+                break
+        except OSError:
+            time.sleep(0.2)
+    else:
+        return
+
+    from app.ai.raven import warm_up
+    warm_up()
+
 # Function to open the web page
 
 
 def open_webpage(icon, item):
-    webbrowser.open("http://127.0.0.1:5000")
+    webbrowser.open(f"http://127.0.0.1:{SERVER_PORT}")
 
 # Function to quit the tray app
 
@@ -28,21 +47,29 @@ def on_quit(icon, item):
     icon.stop()
 
 
-# Load the tray icon image
-image = Image.open("tray/assets/tray_icon.png")
+def main():
+    # Load the tray icon image
+    image = Image.open("tray/assets/tray_icon.png")
+
+    # Define the icon and menu
+    icon = pystray.Icon("Raven")
+    icon.icon = image
+    icon.menu = pystray.Menu(
+        item('Open Web Interface', open_webpage),
+        item('Quit', on_quit)
+    )
+
+    # Run the Flask app in a separate thread
+    flask_thread = threading.Thread(target=run_flask)
+    flask_thread.daemon = True
+    flask_thread.start()
+
+    if WARM_UP:
+        threading.Thread(target=warm_up_when_listening, daemon=True).start()
 
-# Define the icon and menu
-icon = pystray.Icon("Raven")
-icon.icon = image
-icon.menu = pystray.Menu(
-    item('Open Web Interface', open_webpage),
-    item('Quit', on_quit)
-)
+    # Run the tray icon
+    icon.run()
 
-# Run the Flask app in a separate thread
-flask_thread = threading.Thread(target=run_flask)
-flask_thread.daemon = True
-flask_thread.start()
 
-# Run the tray icon
-icon.run()
+if __name__ == "__main__":
+    main()